@@ -0,0 +1,59 @@
+"""
+Checkout latency and query count against cart size.
+
+    python -m benchmarks.checkout [--sizes 1 5 10 20 40 80] [--repeat 20]
+
+The query column should stay flat as the cart grows.
+"""
+import argparse
+
+from benchmarks import env
+
+
+def build_catalog(count):
+    from decimal import Decimal
+    from store.models import Category, Product
+    category = Category.objects.create(name='Bench', slug='bench-checkout')
+    Product.objects.bulk_create([
+        Product(category=category, title=f'Bench product {i}', slug=f'bench-checkout-{i}',
+                price=Decimal('9.99') + i)
+        for i in range(count)
+    ])
+    return list(Product.objects.filter(category=category).values_list('id', flat=True))
+
+
+def run(sizes, repeat):
+    from store.checkout import place_order
+    customer = {'full_name': 'Bench', 'email': 'bench@example.com', 'address': '1 Road',
+                'city': 'Town', 'postal_code': '00000'}
+    product_ids = build_catalog(max(sizes))
+    rows = []
+    for size in sizes:
+        quantities = {pid: 1 for pid in product_ids[:size]}
+        samples, queries = [], 0
+        for _ in range(repeat):
+            with env.count_queries() as ctx:
+                elapsed, _ = env.timed(place_order, customer, quantities)
+            samples.append(elapsed)
+            queries = len(ctx)
+        rows.append((size, queries, env.summarize(samples)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 10, 20, 40, 80])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+    env.setup()
+    try:
+        rows = run(args.sizes, args.repeat)
+    finally:
+        env.teardown()
+    print(f'{"lines":>6} {"queries":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for size, queries, stats in rows:
+        print(f'{size:>6} {queries:>8} {stats["p50_ms"]:>8.2f} {stats["p95_ms"]:>8.2f} {stats["p99_ms"]:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
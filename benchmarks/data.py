@@ -0,0 +1,151 @@
+"""
+Deterministic synthetic catalogs for the benchmarks.
+
+    generate(products=10000, categories=50, orders=5000, users=200, seed=1)
+
+builds categories, products (with search-friendly titles), users who can
+log in by username, email or phone, and historical orders spread over the
+last ``days`` days. Everything is bulk inserted in batches, so a million
+products is a matter of minutes rather than hours. The same arguments and
+seed always produce the same rows.
+"""
+import datetime
+import random
+import time
+from decimal import Decimal
+
+ADJECTIVES = ['classic', 'compact', 'deluxe', 'eco', 'ergonomic', 'heavy', 'light', 'mini', 'portable',
+              'premium', 'pro', 'rugged', 'slim', 'smart', 'vintage', 'wireless']
+COLOURS = ['black', 'blue', 'green', 'grey', 'orange', 'pink', 'red', 'silver', 'white', 'yellow']
+NOUNS = ['backpack', 'blender', 'camera', 'chair', 'desk', 'drill', 'headphones', 'jacket', 'kettle',
+         'keyboard', 'lamp', 'laptop', 'monitor', 'mug', 'phone', 'sandals', 'shoes', 'speaker', 'tent',
+         'watch']
+PASSWORD = 'bench-password'
+BATCH_SIZE = 5000
+
+
+def user_credentials(index):
+    return {
+        'username': f'bench{index}',
+        'email': f'bench{index}@example.com',
+        'phone': f'+1555{index:07d}',
+        'password': PASSWORD,
+    }
+
+
+def search_terms():
+    return ADJECTIVES + COLOURS + NOUNS
+
+
+def _batches(count, size=BATCH_SIZE):
+    for start in range(0, count, size):
+        yield start, min(start + size, count)
+
+
+def generate(products=10000, categories=50, orders=5000, users=200, seed=1, days=90,
+             max_lines=5, stdout=None):
+    """Populate the current database and return a summary of what was made."""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+
+    from store import catalog_cache, recommendations, rollups, search
+    from store.identifiers import EMAIL, PHONE, USERNAME, make_key
+    from store.models import Category, LoginIdentifier, Order, OrderItem, Product, UserProfile
+
+    rng = random.Random(seed)
+    started = time.monotonic()
+
+    def report(message):
+        if stdout is not None:
+            stdout.write(f'{message} ({time.monotonic() - started:.1f}s)\n')
+
+    Category.objects.bulk_create([
+        Category(name=f'Category {n}', slug=f'category-{n}') for n in range(categories)
+    ], batch_size=BATCH_SIZE)
+    category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+    report(f'{categories} categories')
+
+    prices = []
+    for start, end in _batches(products):
+        batch = []
+        for n in range(start, end):
+            adjective, colour, noun = rng.choice(ADJECTIVES), rng.choice(COLOURS), rng.choice(NOUNS)
+            price = Decimal(rng.randrange(199, 99999)) / 100
+            prices.append(price)
+            batch.append(Product(
+                category_id=category_ids[n % len(category_ids)],
+                title=f'{adjective.title()} {colour} {noun} {n}',
+                slug=f'{adjective}-{colour}-{noun}-{n}',
+                description=f'A {adjective} {noun} in {colour}. ' + ' '.join(rng.sample(search_terms(), 6)),
+                price=price,
+                in_stock=rng.random() > 0.05,
+            ))
+        with transaction.atomic():
+            Product.objects.bulk_create(batch)
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    report(f'{products} products')
+
+    # Hashing once keeps user creation fast; every bench user shares a password.
+    password = make_password(PASSWORD)
+    for start, end in _batches(users):
+        with transaction.atomic():
+            created = User.objects.bulk_create([
+                User(username=c['username'], email=c['email'], password=password)
+                for c in map(user_credentials, range(start, end))
+            ])
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, phone=user_credentials(n)['phone'])
+                for n, user in zip(range(start, end), created)
+            ])
+            # bulk_create skips the signals that maintain the login lookup.
+            LoginIdentifier.objects.bulk_create([
+                LoginIdentifier(key=make_key(kind, value), kind=kind, user=user)
+                for n, user in zip(range(start, end), created)
+                for kind, value in ((USERNAME, user.username), (EMAIL, user.email),
+                                    (PHONE, user_credentials(n)['phone']))
+            ])
+    report(f'{users} users')
+
+    now = timezone.now()
+    for start, end in _batches(orders, BATCH_SIZE // 5):
+        lines_by_order, placed_on = [], {}
+        batch = []
+        for n in range(start, end):
+            lines = {}
+            for _ in range(rng.randint(1, max_lines)):
+                # Half the lines go to a long-tailed set of best sellers.
+                if rng.random() < 0.5:
+                    index = min(int(rng.paretovariate(1.2)) - 1, len(product_ids) - 1)
+                else:
+                    index = rng.randrange(len(product_ids))
+                lines[index] = rng.randint(1, 3)
+            lines_by_order.append(lines)
+            batch.append(Order(
+                full_name=f'Customer {n}', email=f'customer{n}@example.com', address=f'{n} Bench Street',
+                city='Benchville', postal_code=f'{n % 100000:05d}', paid=rng.random() > 0.1,
+                item_count=sum(lines.values()),
+                total=sum((prices[i] * qty for i, qty in lines.items()), Decimal('0.00')),
+            ))
+        with transaction.atomic():
+            created = Order.objects.bulk_create(batch)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_ids[i], price=prices[i], quantity=qty)
+                for order, lines in zip(created, lines_by_order)
+                for i, qty in lines.items()
+            ])
+            # created_at is auto_now_add, so backdate with one UPDATE per day.
+            for order in created:
+                placed_on.setdefault(rng.randrange(days), []).append(order.pk)
+            for day, ids in placed_on.items():
+                Order.objects.filter(pk__in=ids).update(created_at=now - datetime.timedelta(days=day, hours=1))
+    # Orders went in with bulk_create, which bypasses the incremental rollups.
+    rollups.rebuild(timezone.localdate(now) - datetime.timedelta(days=days), timezone.localdate(now))
+    recommendations.build()
+    report(f'{orders} orders')
+
+    catalog_cache.bump_version()
+    search.rebuild_index()
+    report('search index')
+    return {'categories': categories, 'products': products, 'users': users, 'orders': orders, 'seed': seed}
@@ -0,0 +1,186 @@
+"""
+Concurrent browse + checkout throughput for the SQLite connection profiles.
+
+    python -m benchmarks.db_concurrency [--products 5000] [--clients 16] [--duration 10]
+        [--write-ratio 0.2] [--workers 4] [--threads 4] [--json results.json]
+
+Each profile gets its own freshly seeded database and a gunicorn server:
+
+* ``baseline``: the original settings (rollback journal, a connection per
+  request, deferred transactions).
+* ``tuned``: STORE_SQLITE_PRAGMAS (WAL etc.), persistent connections and
+  immediate transactions.
+* ``tuned+replica``: as ``tuned``, with catalog reads routed to a copy of
+  the seeded file through store.db_routing.
+
+Clients mostly browse; ``--write-ratio`` of their operations add an item to
+the cart and check out. Errors are 4xx/5xx responses, typically "database is
+locked".
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from benchmarks import env
+from benchmarks.server_concurrency import free_port, seed, wait_for
+
+PROFILES = ('baseline', 'tuned', 'tuned+replica')
+BROWSE_PATHS = ['/products/', '/products/?page=2', '/category/cat-{c}/', '/products/?q=item',
+                '/product/item-{n}/']
+
+
+class Shopper:
+    """One keep-alive connection with its own cookies."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookies = {}
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, data=None):
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.cookies.get('csrftoken', ''))
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            return 599
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status
+
+    def close(self):
+        self.conn.close()
+
+
+def drive(port, clients, duration, products, write_ratio):
+    results = {'browse': [], 'checkout': []}
+    errors = {'browse': 0, 'checkout': 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        rng = random.Random()
+        shopper = Shopper(port)
+        shopper.request('GET', '/products/')  # picks up the CSRF cookie
+        local = {'browse': [], 'checkout': []}
+        failed = {'browse': 0, 'checkout': 0}
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            if rng.random() < write_ratio:
+                kind = 'checkout'
+                statuses = [
+                    shopper.request('POST', f'/cart/add/{rng.randrange(products) + 1}/',
+                                    {'quantity': rng.randint(1, 3)}),
+                    shopper.request('POST', '/checkout/', {
+                        'full_name': 'Bench Shopper', 'email': 'shopper@example.com',
+                        'address': '1 Main St', 'city': 'Springfield', 'postal_code': '12345',
+                        'idempotency_key': f'{rng.getrandbits(64):016x}',
+                    }),
+                ]
+            else:
+                kind = 'browse'
+                path = rng.choice(BROWSE_PATHS).format(c=rng.randrange(25), n=rng.randrange(products))
+                statuses = [shopper.request('GET', path)]
+            elapsed = time.perf_counter() - started
+            if max(statuses) >= 400:
+                failed[kind] += 1
+            else:
+                local[kind].append(elapsed)
+        shopper.close()
+        with lock:
+            for kind in results:
+                results[kind].extend(local[kind])
+                errors[kind] += failed[kind]
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = {}
+    for kind, latencies in results.items():
+        stats[kind] = env.summarize(latencies)
+        stats[kind].update(ops=len(latencies), ops_per_s=len(latencies) / duration, errors=errors[kind])
+    return stats
+
+
+def run_profile(profile, args, workdir):
+    db_path = os.path.join(workdir, f'{profile.replace("+", "-")}.sqlite3')
+    base = 'baseline' if profile == 'baseline' else 'tuned'
+    server_env = seed(db_path, args.products, BENCH_SQLITE_PROFILE=base)
+    if profile.endswith('+replica'):
+        # Seeding closed every connection, which checkpoints the WAL into the
+        # main file, so a plain copy is a consistent snapshot.
+        replica_path = db_path.replace('.sqlite3', '-replica.sqlite3')
+        shutil.copyfile(db_path, replica_path)
+        server_env['BENCH_REPLICA_PATH'] = replica_path
+
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', 'shop.wsgi:application', '-b', f'127.0.0.1:{port}',
+        '-w', str(args.workers), '--threads', str(args.threads), '--log-level', 'warning',
+    ]
+    server = subprocess.Popen(command, cwd=env.ROOT, env=server_env)
+    try:
+        if not wait_for(port):
+            raise RuntimeError(f'gunicorn did not start for {profile}')
+        return drive(port, args.clients, args.duration, args.products, args.write_ratio)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--json', help='Write results to this file.')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='shop-bench-')
+    results = {}
+    try:
+        for profile in args.profiles:
+            print(f'{profile}: seeding {args.products} products and running {args.clients} clients ...')
+            results[profile] = run_profile(profile, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{"profile":<14} {"kind":<9} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for profile, stats in results.items():
+        for kind, row in stats.items():
+            print(f'{profile:<14} {kind:<9} {row["ops_per_s"]:>8.1f} {row["p50_ms"]:>8.1f} '
+                  f'{row["p99_ms"]:>8.1f} {row["errors"]:>7}')
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Checkout with its side effects queued, and how fast run_workers drains them.
+
+    python -m benchmarks.job_queue [--orders 500] [--processes 1 2 4]
+
+For each worker count: place ``--orders`` orders (each queues a stats job
+and a confirmation email), then run ``manage.py run_workers --once`` until
+the queue is empty. The daily rollup must count every order exactly once;
+the script exits 1 if it doesn't, or if any job is left undone.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import env, stock_contention
+
+CUSTOMER = stock_contention.CUSTOMER
+
+
+def place_orders(count, products=50, seed=1):
+    import random
+    from decimal import Decimal
+    from store.checkout import place_order
+    from store.models import Category, Product
+    category = Category.objects.create(name='Queue', slug='queue')
+    Product.objects.bulk_create([
+        Product(category=category, title=f'Queue item {i}', slug=f'queue-item-{i}', price=Decimal('9.99'))
+        for i in range(products)
+    ])
+    ids = list(Product.objects.values_list('id', flat=True))
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        quantities = {pid: rng.randint(1, 3) for pid in rng.sample(ids, rng.randint(1, 4))}
+        elapsed, _ = env.timed(place_order, CUSTOMER, quantities)
+        samples.append(elapsed)
+    return env.summarize(samples)
+
+
+def drain(processes):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, 'manage.py', 'run_workers', '--once', '--processes', str(processes)],
+                   cwd=env.ROOT, env=os.environ, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def check(orders):
+    from django.db.models import Sum
+    from store import jobs
+    from store.models import DailySales, Job
+    problems = []
+    counted = DailySales.objects.aggregate(n=Sum('orders'))['n'] or 0
+    if counted != orders:
+        problems.append(f'rollups count {counted} orders, {orders} were placed')
+    left = Job.objects.exclude(status=Job.DONE).count()
+    if left:
+        problems.append(f'{left} jobs not done')
+    return jobs.stats(window=3600), problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args(argv)
+    if len(args.processes) > 1:
+        # One fresh database per run: Django is set up once per process.
+        for processes in args.processes:
+            subprocess.run([sys.executable, '-m', 'benchmarks.job_queue', '--orders', str(args.orders),
+                            '--processes', str(processes)], cwd=env.ROOT, check=True)
+        return
+
+    os.environ['EMAIL_BACKEND'] = 'django.core.mail.backends.dummy.EmailBackend'
+    workdir = tempfile.mkdtemp(prefix='shop-bench-')
+    try:
+        stock_contention.setup(os.path.join(workdir, 'queue.sqlite3'))
+        checkout = place_orders(args.orders)
+        elapsed = drain(args.processes[0])
+        stats, problems = check(args.orders)
+    finally:
+        from django.db import connections
+        connections.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    jobs = 2 * args.orders
+    print(f'{args.processes[0]} workers: checkout p50 {checkout["p50_ms"]:.1f} ms; '
+          f'{jobs} jobs drained in {elapsed:.2f}s ({jobs / elapsed:.0f} jobs/s, '
+          f'longest wait {stats["recent_wait_max_seconds"]:.2f}s)')
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
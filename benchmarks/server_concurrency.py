@@ -0,0 +1,166 @@
+"""
+Concurrency limits of the catalog views under uvicorn (ASGI, async views)
+versus gunicorn (WSGI, sync views).
+
+    python -m benchmarks.server_concurrency [--products 20000] [--levels 1 8 32 128]
+        [--duration 10] [--workers 2] [--threads 4] [--json results.json]
+
+Each server is started against the same seeded SQLite file and hit by an
+increasing number of concurrent keep-alive clients browsing the catalog.
+Servers that aren't installed are skipped.
+"""
+import argparse
+import csv
+import http.client
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import env
+
+PATHS = ['/', '/products/', '/products/?page=3', '/category/cat-1/', '/category/cat-2/',
+         '/products/?q=item', '/product/item-{n}/', '/cart/']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(db_path, products, **extra_env):
+    base_env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings', BENCH_DB_PATH=db_path, **extra_env)
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], cwd=env.ROOT, env=base_env, check=True)
+    feed = os.path.join(os.path.dirname(db_path), 'feed.csv')
+    with open(feed, 'w', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['category_slug', 'title', 'slug', 'description', 'price'])
+        for n in range(products):
+            writer.writerow([f'cat-{n % 25}', f'Item {n}', f'item-{n}', f'Benchmark item number {n}', f'{n % 500}.99'])
+    subprocess.run([sys.executable, 'manage.py', 'import_catalog', feed], cwd=env.ROOT, env=base_env,
+                   check=True, stdout=subprocess.DEVNULL)
+    return base_env
+
+
+def server_commands(port, workers, threads):
+    commands = {}
+    if importlib.util.find_spec('uvicorn'):
+        commands['uvicorn-asgi'] = ('async', [
+            sys.executable, '-m', 'uvicorn', 'shop.asgi:application',
+            '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+        ])
+    if shutil.which('gunicorn') or importlib.util.find_spec('gunicorn'):
+        commands['gunicorn-wsgi'] = ('sync', [
+            sys.executable, '-m', 'gunicorn', 'shop.wsgi:application', '-b', f'127.0.0.1:{port}',
+            '-w', str(workers), '--threads', str(threads), '--log-level', 'warning',
+        ])
+    return commands
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def drive(port, concurrency, duration, products):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        rng = random.Random()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.monotonic() < stop_at:
+            path = rng.choice(PATHS).format(n=rng.randrange(products))
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            elapsed = time.perf_counter() - started
+            if ok:
+                local.append(elapsed)
+            else:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = env.summarize(latencies)
+    stats.update(concurrency=concurrency, rps=len(latencies) / duration, errors=errors[0])
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--json', help='Write results to this file.')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='shop-bench-')
+    db_path = os.path.join(workdir, 'bench.sqlite3')
+    print(f'Seeding {args.products} products into {db_path} ...')
+    base_env = seed(db_path, args.products)
+
+    port = free_port()
+    commands = server_commands(port, args.workers, args.threads)
+    if not commands:
+        print('Neither uvicorn nor gunicorn is installed; nothing to compare.')
+        return
+    results = {}
+    try:
+        for name, (mode, command) in commands.items():
+            server = subprocess.Popen(command, cwd=env.ROOT, env=dict(base_env, STORE_VIEW_MODE=mode))
+            try:
+                if not wait_for(port):
+                    print(f'{name} did not start; skipping.')
+                    continue
+                results[name] = [drive(port, level, args.duration, args.products) for level in args.levels]
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{"server":<14} {"conc":>5} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for name, rows in results.items():
+        for row in rows:
+            print(f'{name:<14} {row["concurrency"]:>5} {row["rps"]:>8.1f} {row["p50_ms"]:>8.1f} '
+                  f'{row["p99_ms"]:>8.1f} {row["errors"]:>7}')
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Session table writes per cart operation, by session engine.
+
+    python -m benchmarks.session_writes [--shoppers 20] [--rounds 5]
+
+Each shopper adds a few products, changes a quantity, re-sends a quantity
+it already has and views the cart, ``--rounds`` times over. Writes are the
+INSERT/UPDATE/DELETE statements on django_session, including the final
+flush of store.sessions' write-behind queue.
+"""
+import argparse
+import time
+
+from benchmarks import env
+
+ENGINES = ['django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db', 'store.sessions']
+
+
+def build_catalog(count):
+    from decimal import Decimal
+    from store.models import Category, Product
+    category = Category.objects.create(name='Bench', slug='bench-sessions')
+    Product.objects.bulk_create([
+        Product(category=category, title=f'Bench product {i}', slug=f'bench-sessions-{i}', price=Decimal('9.99'))
+        for i in range(count)
+    ])
+    return list(Product.objects.filter(category=category).values_list('id', flat=True))
+
+
+def session_writes(queries):
+    return sum(1 for query in queries if 'django_session' in query['sql']
+               and query['sql'].lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE'))
+
+
+def shop(client, product_ids, rounds):
+    """One shopper's visit; returns the number of cart operations."""
+    from django.urls import reverse
+    operations = 0
+    for _ in range(rounds):
+        for product_id in product_ids:
+            client.post(reverse('store:add_to_cart', args=[product_id]), {'quantity': 1})
+            operations += 1
+        client.post(reverse('store:update_cart', args=[product_ids[0]]), {'quantity': 3})
+        client.post(reverse('store:update_cart', args=[product_ids[0]]), {'quantity': 3})
+        client.get(reverse('store:cart_view'))
+        operations += 3
+    return operations
+
+
+def run(engine, shoppers, rounds, product_ids):
+    from django.core.cache import caches
+    from django.test import Client
+    from django.test.utils import override_settings
+    from store import sessions
+    with override_settings(SESSION_ENGINE=engine, STORE_SESSION_FLUSH_INTERVAL=0,
+                           STORE_SESSION_FLUSH_BATCH=10 ** 6, STORE_PAGE_CACHE=False):
+        caches['sessions'].clear()
+        operations, samples = 0, []
+        with env.count_queries() as ctx:
+            for i in range(shoppers):
+                client = Client()
+                basket = product_ids[i % len(product_ids):][:3] or product_ids[:3]
+                started = time.perf_counter()
+                operations += shop(client, basket, rounds)
+                samples.append(time.perf_counter() - started)
+            sessions.queue.flush()
+        writes = session_writes(ctx.captured_queries)
+    return operations, writes, env.summarize([sample / (rounds * 6) for sample in samples])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shoppers', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args(argv)
+    env.setup()
+    try:
+        product_ids = build_catalog(12)
+        rows = [(engine, *run(engine, args.shoppers, args.rounds, product_ids)) for engine in ENGINES]
+    finally:
+        env.teardown()
+    print(f'{"engine":<45} {"cart ops":>9} {"writes":>7} {"writes/op":>10} {"p50 ms/op":>10}')
+    for engine, operations, writes, stats in rows:
+        print(f'{engine:<45} {operations:>9} {writes:>7} {writes / operations:>10.3f} {stats["p50_ms"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+# Settings for benchmark servers: production-like (DEBUG off) and pointed at
+# a throwaway database chosen by the benchmark script.
+import os
+
+from shop.settings import *  # noqa: F401,F403
+
+DEBUG = False
+STORE_JOBS_EAGER = False
+ALLOWED_HOSTS = ['*']
+DATABASES['default']['NAME'] = os.environ.get('BENCH_DB_PATH', BASE_DIR / 'bench.sqlite3')  # noqa: F405
+if os.environ.get('BENCH_SQLITE_PROFILE') == 'baseline':
+    # What the project shipped with: rollback journal, a connection per
+    # request, deferred transactions.
+    DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DATABASES['default']['NAME']}  # noqa: F405
+    STORE_SQLITE_PRAGMAS = {}
+if os.environ.get('BENCH_REPLICA_PATH'):
+    DATABASES['replica'] = dict(DATABASES['default'], NAME=os.environ['BENCH_REPLICA_PATH'])  # noqa: F405
+# The servers run several worker processes, which can't share the per-process
+# session cache; BENCH_SESSION_ENGINE=store.sessions needs a shared one.
+SESSION_ENGINE = os.environ.get('BENCH_SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+STORE_VIEW_MODE = os.environ.get('STORE_VIEW_MODE', 'sync')
+STORE_PAGE_CACHE = os.environ.get('BENCH_PAGE_CACHE', '0') == '1'
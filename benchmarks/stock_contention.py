@@ -0,0 +1,168 @@
+"""
+Concurrent checkouts of one hot product must never oversell it.
+
+    python -m benchmarks.stock_contention [--threads 16] [--stock 200] [--max-quantity 3]
+        [--reserve] [--others 20]
+
+``--threads`` buyers race to buy ``--stock`` units of one product (plus one
+of ``--others`` cold products per order) until it sells out. With
+``--reserve`` each buyer first holds the units in a cart reservation, and a
+sweeper thread keeps releasing expired holds meanwhile. Afterwards the
+units sold, the stock left and the order lines have to agree; the script
+exits 1 if they don't.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from benchmarks import env
+
+CUSTOMER = {'full_name': 'Stress', 'email': 'stress@example.com', 'address': '1 Road',
+            'city': 'Town', 'postal_code': '00000'}
+
+
+def setup(db_path):
+    os.environ['BENCH_DB_PATH'] = db_path
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    if env.ROOT not in sys.path:
+        sys.path.insert(0, env.ROOT)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def build_catalog(stock, others):
+    from decimal import Decimal
+    from store.models import Category, Product
+    category = Category.objects.create(name='Stress', slug='stress')
+    hot = Product.objects.create(category=category, title='Hot item', slug='hot-item',
+                                 price=Decimal('19.99'), stock_quantity=stock)
+    Product.objects.bulk_create([
+        Product(category=category, title=f'Cold item {i}', slug=f'cold-item-{i}', price=Decimal('4.99'),
+                stock_quantity=1_000_000)
+        for i in range(others)
+    ])
+    cold = list(Product.objects.exclude(pk=hot.pk).values_list('id', flat=True))
+    return hot.pk, cold
+
+
+def run(threads, stock, max_quantity, reserve, others):
+    from django.db import OperationalError, close_old_connections
+    from django.test.utils import override_settings
+    from store import inventory
+    from store.checkout import CheckoutError, place_order
+
+    hot, cold = build_catalog(stock, others)
+    outcomes = {'orders': 0, 'units': 0, 'sold_out': 0, 'locked': 0, 'latencies': []}
+    lock = threading.Lock()
+    sold_out = threading.Event()
+
+    def buyer():
+        rng = random.Random()
+        local = {'orders': 0, 'units': 0, 'sold_out': 0, 'locked': 0, 'latencies': []}
+        while not sold_out.is_set():
+            quantity = rng.randint(1, max_quantity)
+            quantities = {hot: quantity}
+            if cold:
+                quantities[rng.choice(cold)] = 1
+            cart_key = uuid.uuid4().hex
+            started = time.perf_counter()
+            try:
+                if reserve:
+                    inventory.reserve(cart_key, quantities)
+                place_order(CUSTOMER, quantities, cart_key=cart_key)
+            except (CheckoutError, inventory.InsufficientStock):
+                local['sold_out'] += 1
+                if local['sold_out'] >= 3:
+                    sold_out.set()
+            except OperationalError:
+                local['locked'] += 1
+            else:
+                local['orders'] += 1
+                local['units'] += quantity
+                local['latencies'].append(time.perf_counter() - started)
+            finally:
+                close_old_connections()
+        with lock:
+            for key, value in local.items():
+                outcomes[key] += value
+
+    def sweeper():
+        while not sold_out.is_set():
+            inventory.release_expired(batch_size=100)
+            close_old_connections()
+            time.sleep(0.05)
+
+    # Short holds, so the sweeper really races the buyers.
+    with override_settings(STORE_STOCK_RESERVATIONS=reserve, STORE_RESERVATION_SECONDS=0.2):
+        workers = [threading.Thread(target=buyer) for _ in range(threads)]
+        if reserve:
+            workers.append(threading.Thread(target=sweeper))
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        inventory.release_expired()
+    return hot, outcomes, elapsed
+
+
+def check(hot, stock, outcomes):
+    from django.db.models import Sum
+    from store.models import OrderItem, Product, StockReservation
+    product = Product.objects.get(pk=hot)
+    ordered = OrderItem.objects.filter(product=hot).aggregate(units=Sum('quantity'))['units'] or 0
+    held = StockReservation.objects.filter(product=hot).aggregate(units=Sum('quantity'))['units'] or 0
+    problems = []
+    if ordered > stock:
+        problems.append(f'oversold: {ordered} units ordered from a stock of {stock}')
+    if product.stock_quantity + ordered + held != stock:
+        problems.append(f'stock {product.stock_quantity} + ordered {ordered} + held {held} != {stock}')
+    if ordered != outcomes['units']:
+        problems.append(f'{outcomes["units"]} units reported sold but {ordered} in order lines')
+    if product.in_stock != (product.stock_quantity > 0):
+        problems.append(f'in_stock={product.in_stock} with {product.stock_quantity} left')
+    return product.stock_quantity, ordered, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--max-quantity', type=int, default=3)
+    parser.add_argument('--reserve', action='store_true', help='Hold units in a cart reservation first.')
+    parser.add_argument('--others', type=int, default=20, help='Cold products mixed into each order.')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='shop-bench-')
+    try:
+        setup(os.path.join(workdir, 'stress.sqlite3'))
+        hot, outcomes, elapsed = run(args.threads, args.stock, args.max_quantity, args.reserve, args.others)
+        left, ordered, problems = check(hot, args.stock, outcomes)
+    finally:
+        from django.db import connections
+        connections.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = env.summarize(outcomes['latencies'])
+    print(f'{outcomes["orders"]} orders for {ordered} of {args.stock} units in {elapsed:.2f}s '
+          f'({outcomes["orders"] / elapsed:.0f} orders/s, p50 {stats["p50_ms"]:.1f} ms, '
+          f'p99 {stats["p99_ms"]:.1f} ms); {left} left')
+    print(f'{outcomes["sold_out"]} rejected for lack of stock, {outcomes["locked"]} database lock errors')
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if problems:
+        sys.exit(1)
+    print('OK: no overselling')
+
+
+if __name__ == '__main__':
+    main()
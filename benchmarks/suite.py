@@ -0,0 +1,282 @@
+"""
+Latency, throughput and query counts for every store URL.
+
+    python -m benchmarks.suite [--products 10000] [--categories 50] [--orders 5000]
+        [--users 200] [--mix mixed] [--sessions 300] [--seed 1]
+        [--output results.json] [--compare baseline.json] [--threshold 20]
+
+Builds a synthetic catalog (benchmarks.data) in a throwaway test database,
+then replays simulated visitor sessions through the Django test client.
+Each session follows one scenario (browse, search, cart, checkout, login)
+chosen by the weights of ``--mix``. Every request is timed and its SQL
+queries counted, and results are grouped by URL name.
+
+``--output`` writes the results as sorted, rounded JSON so two runs can be
+diffed; ``--compare`` prints the change against an earlier file and exits
+non-zero when a view's query count grew or its p95 regressed by more than
+``--threshold`` percent. For real servers and concurrency see
+benchmarks.server_concurrency.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from benchmarks import data, env
+
+MIXES = {
+    'browse': {'browse': 1},
+    'search': {'search': 1},
+    'cart': {'cart': 1},
+    'checkout': {'checkout': 1},
+    'login': {'login': 1},
+    'mixed': {'browse': 50, 'search': 20, 'cart': 15, 'checkout': 5, 'login': 10},
+}
+CUSTOMER = {'full_name': 'Bench Customer', 'email': 'customer@example.com', 'address': '1 Bench Street',
+            'city': 'Benchville', 'postal_code': '00000'}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.recording = True
+
+    def request(self, client, method, path, data=None, **extra):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from django.urls import resolve
+
+        name = resolve(urlsplit(path).path).url_name
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, **extra)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 500:
+            raise RuntimeError(f'{method.upper()} {path} returned {response.status_code}')
+        if self.recording:
+            entry = self.samples.setdefault(name, {'latencies': [], 'queries': [], 'statuses': {}})
+            entry['latencies'].append(elapsed)
+            entry['queries'].append(len(ctx))
+            status = str(response.status_code)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+        return response
+
+
+class Catalog:
+    # What the scenarios pick from, loaded once after generation.
+    def __init__(self, users):
+        from store.models import Category, Product
+        self.category_slugs = list(Category.objects.values_list('slug', flat=True))
+        rows = list(Product.objects.filter(in_stock=True).values_list('id', 'slug'))
+        self.product_ids = [pid for pid, _ in rows]
+        self.product_slugs = [slug for _, slug in rows]
+        self.users = users
+        self.registered = 0
+
+
+def browse(client, rec, catalog, rng):
+    get = lambda path: rec.request(client, 'get', path)  # noqa: E731
+    get('/')
+    if rng.random() < 0.5:
+        get('/?page=2')
+    slug = rng.choice(catalog.category_slugs)
+    get(f'/category/{slug}/')
+    get(f'/category/{slug}/?page={rng.randint(2, 5)}')
+    get('/products/')
+    for _ in range(rng.randint(1, 3)):
+        get(f'/product/{rng.choice(catalog.product_slugs)}/')
+
+
+def search(client, rec, catalog, rng):
+    terms = data.search_terms()
+    for _ in range(rng.randint(1, 3)):
+        query = ' '.join(rng.sample(terms, rng.choice([1, 1, 2])))
+        response = rec.request(client, 'get', '/products/', {'q': query})
+        # Pages served from the page cache carry no template context.
+        page = response.context.get('page_obj') if response.context else None
+        if page is not None and page.has_next() and rng.random() < 0.3:
+            rec.request(client, 'get', f'/products/?{page.next_query}')
+    rec.request(client, 'get', f'/product/{rng.choice(catalog.product_slugs)}/')
+
+
+def _fill_cart(client, rec, catalog, rng, lines):
+    for product_id in rng.sample(catalog.product_ids, lines):
+        rec.request(client, 'post', f'/cart/add/{product_id}/', {'quantity': rng.randint(1, 3)})
+    return product_id
+
+
+def cart(client, rec, catalog, rng):
+    last = _fill_cart(client, rec, catalog, rng, rng.randint(1, 4))
+    rec.request(client, 'get', '/cart/')
+    rec.request(client, 'post', f'/cart/update/{last}/', {'quantity': rng.randint(1, 5)})
+    rec.request(client, 'get', '/cart/api/')
+    operations = [{'op': 'add', 'product_id': pid, 'quantity': 1}
+                  for pid in rng.sample(catalog.product_ids, rng.randint(1, 5))]
+    rec.request(client, 'post', '/cart/api/', json.dumps({'operations': operations}),
+                content_type='application/json')
+    rec.request(client, 'get', f'/cart/remove/{last}/')
+    rec.request(client, 'get', '/cart/')
+
+
+def checkout(client, rec, catalog, rng):
+    _fill_cart(client, rec, catalog, rng, rng.randint(1, 6))
+    rec.request(client, 'get', '/cart/')
+    rec.request(client, 'get', '/checkout/')
+    rec.request(client, 'post', '/checkout/', dict(CUSTOMER, idempotency_key=uuid.uuid4().hex))
+
+
+def login(client, rec, catalog, rng):
+    if rng.random() < 0.1:
+        catalog.registered += 1
+        name = f'newbench{catalog.registered}-{uuid.uuid4().hex[:8]}'
+        rec.request(client, 'get', '/register/')
+        rec.request(client, 'post', '/register/', {
+            'username': name, 'first_name': 'New', 'last_name': 'Customer', 'email': f'{name}@example.com',
+            'password': data.PASSWORD, 'confirm_password': data.PASSWORD,
+        })
+    else:
+        credentials = data.user_credentials(rng.randrange(catalog.users))
+        identifier = credentials[rng.choice(['username', 'email', 'phone'])]
+        rec.request(client, 'get', '/login/')
+        rec.request(client, 'post', '/login/', {'username': identifier, 'password': credentials['password']})
+    rec.request(client, 'get', '/')
+    rec.request(client, 'get', '/cart/')
+    rec.request(client, 'get', '/logout/')
+
+
+SCENARIOS = {'browse': browse, 'search': search, 'cart': cart, 'checkout': checkout, 'login': login}
+
+
+def run(mix, sessions, warmup, catalog, seed):
+    from django.test import Client
+
+    rng = random.Random(seed)
+    names, weights = zip(*MIXES[mix].items())
+    rec = Recorder()
+    rec.recording = False
+    for name in names:
+        for _ in range(warmup):
+            SCENARIOS[name](Client(), rec, catalog, rng)
+    rec.recording = True
+    counts = {}
+    started = time.perf_counter()
+    for _ in range(sessions):
+        name = rng.choices(names, weights)[0]
+        counts[name] = counts.get(name, 0) + 1
+        SCENARIOS[name](Client(), rec, catalog, rng)
+    return rec.samples, time.perf_counter() - started, counts
+
+
+def summarize(samples, wall):
+    views = {}
+    for name, entry in samples.items():
+        latencies, queries = entry['latencies'], entry['queries']
+        stats = env.summarize(latencies)
+        stats.update(
+            rps=len(latencies) / sum(latencies) if sum(latencies) else 0.0,
+            queries_min=min(queries), queries_max=max(queries), queries_mean=sum(queries) / len(queries),
+            statuses=entry['statuses'],
+        )
+        views[name] = {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+    total = sum(len(entry['latencies']) for entry in samples.values())
+    return views, {'requests': total, 'wall_s': round(wall, 3), 'rps': round(total / wall, 3) if wall else 0.0}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=env.ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def all_url_names():
+    from store import urls
+    return sorted(pattern.name for pattern in urls.urlpatterns)
+
+
+def compare(views, baseline_path, threshold):
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)['views']
+    regressions = []
+    print(f'\n{"view":<18} {"p95 ms":>16} {"change":>8} {"queries":>11}')
+    for name in sorted(set(views) | set(baseline)):
+        new, old = views.get(name), baseline.get(name)
+        if new is None or old is None:
+            print(f'{name:<18} {"only in " + ("baseline" if new is None else "this run"):>38}')
+            continue
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        print(f'{name:<18} {old["p95_ms"]:>7.2f}→{new["p95_ms"]:<8.2f} {change:>+7.1f}% '
+              f'{old["queries_max"]:>5}→{new["queries_max"]:<5}')
+        if new['queries_max'] > old['queries_max'] or (threshold is not None and change > threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--sessions', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=2, help='Unrecorded sessions per scenario first.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-page-cache', action='store_true', help='Render every anonymous page.')
+    parser.add_argument('--output', help='Write results to this JSON file.')
+    parser.add_argument('--compare', help='A previous --output file to compare against.')
+    parser.add_argument('--threshold', type=float, help='Fail --compare when a p95 grows by more than this %%.')
+    args = parser.parse_args(argv)
+
+    env.setup()
+    try:
+        from django.conf import settings
+        if args.no_page_cache:
+            settings.STORE_PAGE_CACHE = False
+        dataset = data.generate(args.products, args.categories, args.orders, args.users, seed=args.seed,
+                                stdout=sys.stdout)
+        samples, wall, counts = run(args.mix, args.sessions, args.warmup, Catalog(args.users), args.seed)
+        url_names = all_url_names()
+    finally:
+        env.teardown()
+
+    views, overall = summarize(samples, wall)
+    print(f'\n{"view":<18} {"n":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>9}')
+    for name in sorted(views):
+        row = views[name]
+        queries = f'{row["queries_min"]}-{row["queries_max"]}'
+        print(f'{name:<18} {row["n"]:>6} {row["p50_ms"]:>8.2f} {row["p95_ms"]:>8.2f} {row["p99_ms"]:>8.2f} '
+              f'{row["rps"]:>8.1f} {queries:>9}')
+    print(f'{overall["requests"]} requests in {overall["wall_s"]:.1f}s ({overall["rps"]:.1f} req/s)')
+    missing = [name for name in url_names if name not in views]
+    if missing:
+        print(f'Not exercised by the {args.mix!r} mix: {", ".join(missing)}')
+
+    if args.output:
+        import django
+        result = {
+            'meta': {
+                'revision': git_revision(), 'python': platform.python_version(), 'django': django.get_version(),
+                'dataset': dataset, 'mix': args.mix, 'sessions': counts, 'page_cache': not args.no_page_cache,
+            },
+            'overall': overall,
+            'views': views,
+        }
+        with open(args.output, 'w') as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+    if args.compare:
+        regressions = compare(views, args.compare, args.threshold)
+        if regressions:
+            print(f'Regressed: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Typeahead latency: the in-memory prefix index against a title__icontains query.
+
+    python -m benchmarks.typeahead [--products 50000] [--orders 5000] [--queries 2000]
+
+Queries are the successive prefixes of real titles, as typed one letter at a
+time ("v", "vi", "vin", ..., "vintage r", ...). The index column should stay
+far below a millisecond and run no queries.
+"""
+import argparse
+import random
+
+from benchmarks import env
+
+
+def keystrokes(titles, count, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        title = rng.choice(titles).lower()
+        queries.extend(title[:n] for n in range(1, min(len(title), 16) + 1) if title[n - 1] != ' ')
+    return queries[:count]
+
+
+def run(products, orders, count):
+    from benchmarks import data
+    from store import typeahead
+    from store.models import Product
+    data.generate(products=products, orders=orders, users=100, categories=20)
+    build_time, index = env.timed(typeahead.load)
+    queries = keystrokes(list(Product.objects.values_list('title', flat=True)[:2000]), count)
+
+    index_samples, database_samples, index_queries = [], [], 0
+    for query in queries:
+        with env.count_queries() as ctx:
+            elapsed, _ = env.timed(index.search, query)
+        index_queries += len(ctx)
+        index_samples.append(elapsed)
+    for query in queries[:max(count // 10, 1)]:
+        elapsed, _ = env.timed(lambda: list(Product.objects.filter(title__icontains=query)
+                                            .values_list('id', flat=True)[:typeahead.DEFAULT_LIMIT]))
+        database_samples.append(elapsed)
+    return len(index), build_time, index_queries, env.summarize(index_samples), env.summarize(database_samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args(argv)
+    env.setup()
+    try:
+        size, build_time, index_queries, index_stats, database_stats = run(args.products, args.orders, args.queries)
+    finally:
+        env.teardown()
+    print(f'Index of {size} products built in {build_time:.2f}s; {index_queries} queries while searching.')
+    print(f'{"":<12} {"mean ms":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for name, stats in (('index', index_stats), ('icontains', database_stats)):
+        print(f'{name:<12} {stats["mean_ms"]:>8.3f} {stats["p50_ms"]:>8.3f} {stats["p95_ms"]:>8.3f} {stats["p99_ms"]:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
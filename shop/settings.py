@@ -2,6 +2,8 @@
 from pathlib import Path
 import os
 
+import django
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'replace-this-later'
@@ -15,6 +17,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.instrumentation.InstrumentationMiddleware',
+    'store.db_routing.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -27,7 +31,8 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'shop.urls'
 
 TEMPLATES = [{
-    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    # DjangoTemplates that also times renders for store.instrumentation.
+    'BACKEND': 'store.instrumentation.TimedDjangoTemplates',
     'DIRS': [BASE_DIR / 'templates'],
     'APP_DIRS': True,
     'OPTIONS': {
@@ -37,6 +42,7 @@ TEMPLATES = [{
             'django.contrib.auth.context_processors.auth',
             'django.contrib.messages.context_processors.messages',
             'store.context_processors.cart_item_count',
+            'store.context_processors.page_cache_placeholders',
         ],
     },
 }]
@@ -44,8 +50,28 @@ TEMPLATES = [{
 WSGI_APPLICATION = 'shop.wsgi.application'
 
 DATABASES = {
-    'default': {'ENGINE': 'django.db.backends.sqlite3','NAME': BASE_DIR / 'db.sqlite3'}
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3','NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests, and wait up to 20s for a lock
+        # instead of failing with "database is locked".
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+    }
 }
+if django.VERSION >= (5, 1):
+    # Take the write lock when a transaction starts, so two writers queue on
+    # busy_timeout rather than deadlocking on a read-to-write upgrade.
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+# Catalog reads can be served from a read-only copy of the database (see
+# store.db_routing); under tests it mirrors default.
+if os.environ.get('STORE_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.environ['STORE_REPLICA_DB'],
+        'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['store.db_routing.PrimaryReplicaRouter']
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -63,7 +89,135 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# EmailOrPhoneBackend also resolves plain usernames (and inherits
+# ModelBackend's permission checks), so a login costs one query, not three.
+# Users loaded without the save signals (loaddata, bulk_create, update())
+# can sign in with their username only until `manage.py
+# sync_login_identifiers` is run.
 AUTHENTICATION_BACKENDS = [
     'store.auth_backends.EmailOrPhoneBackend',
-    'django.contrib.auth.backends.ModelBackend',
-]
\ No newline at end of file
+]
+# Listing pages use cursor (keyset) pagination for next/previous links; set to
+# False to fall back to plain ?page=N offsets.
+STORE_KEYSET_PAGINATION = True
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Sessions are stored in the database by default. With
+# SESSION_ENGINE=store.sessions they live in the STORE_SESSION_CACHE cache
+# instead and are written to the database in bulk every
+# STORE_SESSION_FLUSH_INTERVAL seconds or every STORE_SESSION_FLUSH_BATCH
+# changed sessions (see store.sessions). That cache must be shared by every
+# worker process (Redis, Memcached); outside DEBUG the system checks reject
+# a per-process LocMemCache. Delete expired sessions with expire_sessions.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+STORE_SESSION_CACHE = 'sessions'
+STORE_SESSION_FLUSH_INTERVAL = 5
+STORE_SESSION_FLUSH_BATCH = 500
+
+# Category list / slug map / counts are cached under a catalog version that
+# is bumped whenever a Category or Product is saved or deleted.
+STORE_CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Logged-out visitors get catalog pages from a shared rendered copy with the
+# CSRF token and cart badge filled in per request (see store.page_cache).
+STORE_PAGE_CACHE = True
+STORE_PAGE_CACHE_TIMEOUT = 10 * 60
+# Rendered product cards, keyed by product id and updated_at (see
+# store.templatetags.store_cards).
+STORE_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+STORE_CURRENCY = 'USD'
+
+# Navbar search suggestions (store.typeahead) come from a per-process index
+# kept current by product signals. It is rebuilt in the background when the
+# catalog changed elsewhere, or to pick up new sales, but at most once per
+# STORE_TYPEAHEAD_REFRESH_INTERVAL seconds.
+STORE_TYPEAHEAD_REFRESH_INTERVAL = 60
+STORE_TYPEAHEAD_MAX_AGE = 60 * 60
+
+# "Frequently bought together" (store.recommendations): neighbours stored
+# per product by build_recommendations, how many product_detail shows, and
+# the largest order counted (bigger ones are bulk buys).
+STORE_RECOMMENDATION_TOP_K = 10
+STORE_RECOMMENDATION_LIMIT = 4
+STORE_RECOMMENDATION_MAX_BASKET = 50
+
+# Sitemaps and shopping feeds (store.feeds): where generate_feeds writes
+# them, the site URL their links use, and how many product ids go in each
+# chunk (a sitemap may hold at most 50,000 URLs).
+STORE_FEED_ROOT = MEDIA_ROOT / 'feeds'
+STORE_SITE_URL = os.environ.get('STORE_SITE_URL', 'http://localhost:8000')
+STORE_FEED_CHUNK_SIZE = 10000
+
+# Where carts are kept: SessionCartStorage (in the session payload),
+# DatabaseCartStorage (StoredCart/CartLine tables) or CacheCartStorage.
+STORE_CART_BACKEND = 'store.cart_storage.SessionCartStorage'
+
+# Hold stock for items while they sit in a cart (products with a
+# stock_quantity only). Expired holds are given back by the
+# release_stock_reservations command; run it every minute or so.
+STORE_STOCK_RESERVATIONS = False
+STORE_RESERVATION_SECONDS = 15 * 60
+
+# Background jobs (store.jobs): order stats and emails are queued after
+# checkout and registration and run by `manage.py run_workers`. Failed jobs
+# retry after STORE_JOB_BACKOFF_SECONDS, doubling each attempt; a job running
+# longer than STORE_JOB_TIMEOUT is assumed lost and queued again; finished
+# jobs are kept STORE_JOB_RETENTION seconds. STORE_JOBS_EAGER runs them
+# inline instead; it follows DEBUG so that runserver keeps the rollups,
+# recommendations and emails going without a worker.
+STORE_JOBS_EAGER = DEBUG
+STORE_JOB_BACKOFF_SECONDS = 10
+STORE_JOB_TIMEOUT = 10 * 60
+STORE_JOB_RETENTION = 24 * 60 * 60
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'MyShop <shop@example.com>')
+
+# Calling code assumed for phone numbers entered without a +/00 prefix.
+STORE_DEFAULT_PHONE_COUNTRY_CODE = '1'
+
+# Widths (px) and formats of the resized copies made of every product and
+# category image; templates pick between them with srcset.
+STORE_IMAGE_RENDITION_WIDTHS = (320, 640, 960, 1280)
+STORE_IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+STORE_IMAGE_RENDITION_QUALITY = 80
+
+# 'async' routes home, product_list, product_detail and cart_view to the
+# async views in store.async_views; only worthwhile when served over ASGI.
+STORE_VIEW_MODE = 'sync'
+
+# Per-request SQL, template and view timings (store.instrumentation). Every
+# request is timed for /metrics; the sampled fraction also gets query counts,
+# a Server-Timing header and N+1 warnings: all of them under DEBUG, a tenth
+# otherwise.
+STORE_INSTRUMENTATION = True
+STORE_INSTRUMENTATION_SAMPLE_RATE = 1.0 if DEBUG else 0.1
+STORE_N_PLUS_ONE_THRESHOLD = 5
+STORE_SERVER_TIMING = True
+# Require "Authorization: Bearer <token>" on /metrics when set; without a
+# token only staff users can read it (anyone under DEBUG).
+STORE_METRICS_TOKEN = os.environ.get('STORE_METRICS_TOKEN')
+
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# writer, NORMAL sync is safe under WAL, and a memory map speeds up reads.
+STORE_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+}
+STORE_REPLICA_DATABASE = 'replica'
+# After writing a product or category, a visitor reads from the primary for
+# this many seconds.
+STORE_REPLICA_PIN_SECONDS = 5
@@ -1,23 +1,177 @@
-from django.contrib import admin
+import datetime
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.db.models import F, Value
+from django.db.models.functions import Now, Round
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from . import catalog_cache, rollups
 from .models import Category, Product, Order, OrderItem
+from .pagination import EstimatedCountPaginator
+from .search import search_products
+
+DASHBOARD_RANGES = (7, 30, 90, 365)
+CHART_WIDTH, CHART_HEIGHT = 720, 140
+
+
+def bar_chart(days, key):
+    # Bar geometry for an inline SVG, so the dashboard needs no JS library.
+    peak = max((day[key] for day in days), default=0) or 1
+    width = CHART_WIDTH / max(len(days), 1)
+    bars = []
+    for i, day in enumerate(days):
+        height = float(day[key]) / float(peak) * CHART_HEIGHT
+        bars.append({'x': round(i * width, 2), 'y': round(CHART_HEIGHT - height, 2), 'width': round(max(width - 1, 1), 2),
+                     'height': round(height, 2), 'date': day['date'], 'value': day[key]})
+    return {'bars': bars, 'peak': peak, 'width': CHART_WIDTH, 'height': CHART_HEIGHT}
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     list_display = ('name', 'slug', 'image')  # Add 'image' here
 
+class ScaleAdminMixin:
+    # Large changelists: a cached count for the paginator and no second
+    # COUNT of the unfiltered table for the "N total" link.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CachedCategoryFilter(admin.SimpleListFilter):
+    # Same URL parameter as list_filter = ('category',), but the choices come
+    # from the catalog cache instead of a query on every changelist view.
+    title = 'category'
+    parameter_name = 'category__id__exact'
+
+    def lookups(self, request, model_admin):
+        return [(str(c.id), c.name) for c in catalog_cache.get_categories()]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(category_id=self.value())
+        return queryset
+
+
+class RepriceActionForm(ActionForm):
+    percent = forms.DecimalField(
+        required=False, max_digits=6, decimal_places=2, label='Percent',
+        help_text='For "Reprice": 10 raises prices by 10%, -15 lowers them by 15%.',
+    )
+
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('title','price','in_stock','category','created_at')
-    list_filter = ('in_stock','category')
+class ProductAdmin(ScaleAdminMixin, admin.ModelAdmin):
+    list_display = ('title','price','in_stock','stock_quantity','category','created_at')
+    list_filter = ('in_stock', CachedCategoryFilter)
+    list_select_related = ('category',)
+    ordering = ('-pk',)
+    # Searched through the full-text index (see get_search_results).
     search_fields = ('title','description')
     prepopulated_fields = {'slug': ('title',)}
+    action_form = RepriceActionForm
+    actions = ['mark_in_stock', 'mark_out_of_stock', 'reprice']
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_products(queryset, search_term), False
+
+    # Bulk actions are one UPDATE each. update() skips the save signals, so
+    # the catalog cache is invalidated by hand.
+
+    def _bulk_update(self, request, queryset, message, **values):
+        updated = queryset.order_by().update(updated_at=Now(), **values)
+        catalog_cache.bump_version()
+        self.message_user(request, message.format(count=updated), messages.SUCCESS)
+
+    # Products with a stock_quantity derive in_stock from it, so these only
+    # touch the untracked ones.
+
+    @admin.action(description='Mark selected products in stock')
+    def mark_in_stock(self, request, queryset):
+        self._bulk_update(request, queryset.filter(stock_quantity__isnull=True),
+                          '{count} products marked in stock.', in_stock=True)
+
+    @admin.action(description='Mark selected products out of stock')
+    def mark_out_of_stock(self, request, queryset):
+        self._bulk_update(request, queryset.filter(stock_quantity__isnull=True),
+                          '{count} products marked out of stock.', in_stock=False)
+
+    @admin.action(description='Reprice selected products by a percentage')
+    def reprice(self, request, queryset):
+        try:
+            percent = self.action_form.base_fields['percent'].clean(request.POST.get('percent'))
+        except ValidationError:
+            percent = None
+        if percent is None:
+            self.message_user(request, 'Enter a percentage to reprice by.', messages.ERROR)
+            return
+        if percent <= -100:
+            self.message_user(request, 'Prices cannot be lowered by 100% or more.', messages.ERROR)
+            return
+        factor = Value(1 + percent / 100, output_field=Product._meta.get_field('price'))
+        self._bulk_update(request, queryset, f'{{count}} products repriced by {percent}%.',
+                          price=Round(F('price') * factor, 2))
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    # A <select> of every product doesn't scale; search for one instead.
+    autocomplete_fields = ('product',)
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id','full_name','email','created_at','paid')
+class OrderAdmin(ScaleAdminMixin, admin.ModelAdmin):
+    list_display = ('id','full_name','email','created_at','paid','item_count','total','currency')
+    readonly_fields = ('total','item_count')
     inlines = [OrderItemInline]
+
+    def get_urls(self):
+        return [
+            path('dashboard/', self.admin_site.admin_view(self.sales_dashboard), name='store_order_dashboard'),
+        ] + super().get_urls()
+
+    def sales_dashboard(self, request):
+        # Reads only the daily rollups, never the order tables.
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        days = days if days in DASHBOARD_RANGES else 30
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=days - 1)
+        series = rollups.series(start, end)
+        orders = sum(day['orders'] for day in series)
+        revenue = sum((day['revenue'] for day in series), Decimal('0.00'))
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Sales dashboard',
+            'opts': self.model._meta,
+            'days': days,
+            'ranges': DASHBOARD_RANGES,
+            'start': start,
+            'end': end,
+            'totals': {
+                'orders': orders,
+                'units': sum(day['units'] for day in series),
+                'revenue': revenue,
+                'aov': (revenue / orders).quantize(Decimal('0.01')) if orders else Decimal('0.00'),
+            },
+            'charts': [
+                ('Revenue', bar_chart(series, 'revenue')),
+                ('Units', bar_chart(series, 'units')),
+                ('Average order value', bar_chart(series, 'aov')),
+            ],
+            'top_categories': rollups.top_categories(start, end),
+            'top_products': rollups.top_products(start, end),
+        }
+        return TemplateResponse(request, 'admin/store/order/sales_dashboard.html', context)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Lines may have been edited inline; keep the stored totals in step.
+        form.instance.recalculate_totals()
@@ -1,6 +1,9 @@
-
 from django.apps import AppConfig
 
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from . import checks, instrumentation, jobs, signals  # noqa: F401
+        instrumentation.registry.collectors.append(jobs.metric_lines)
@@ -0,0 +1,83 @@
+"""
+Async versions of the read-heavy catalog views, used when
+STORE_VIEW_MODE = 'async' and the project is served over ASGI.
+
+Database work goes through the async ORM. The remaining sync-only pieces
+(session, request.user, the catalog cache helpers, the cart storage) are
+loaded once in a worker thread before rendering, so the template render
+itself never blocks on the database.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+
+from . import catalog_cache, recommendations
+from .cart import Cart
+from .facets import ProductFilters
+from .models import Product
+from .page_cache import cache_anonymous_page
+from .pagination import KeysetPaginator
+
+
+def _load_request_state(request):
+    # Evaluates the lazy user and session, and the cart summary the
+    # cart_item_count context processor reads.
+    request.user.is_authenticated
+    len(Cart(request))
+
+
+async def _prepare(request):
+    await sync_to_async(_load_request_state)(request)
+
+
+@cache_anonymous_page
+async def home(request):
+    await _prepare(request)
+    categories = await sync_to_async(catalog_cache.get_categories)()
+    products = Product.objects.filter(in_stock=True)
+    page_obj = await KeysetPaginator(products, 12).aget_page(request.GET)
+
+    return render(request, 'store/home.html', {
+        'categories': categories,
+        'page_obj': page_obj,
+        'page_range': page_obj.page_range,
+    })
+
+
+@cache_anonymous_page
+async def product_list(request, category_slug=None):
+    await _prepare(request)
+    category = None
+    if category_slug:
+        category = await sync_to_async(catalog_cache.get_category_or_404)(category_slug)
+    filters = await sync_to_async(ProductFilters)(request.GET, category)
+    products = await sync_to_async(filters.products)()
+    page_obj = await KeysetPaginator(products, 12, ordering=filters.ordering).aget_page(request.GET)
+
+    return render(request, 'store/product_list.html', {
+        'category': category,
+        'filters': filters,
+        'facets': await sync_to_async(filters.facets)(),
+        'page_obj': page_obj,
+        'page_range': page_obj.page_range,
+    })
+
+
+@cache_anonymous_page
+async def product_detail(request, slug):
+    await _prepare(request)
+    try:
+        product = await Product.objects.select_related('category').aget(slug=slug, in_stock=True)
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
+    return render(request, 'store/product_detail.html', {
+        'product': product,
+        'recommendations': [p async for p in recommendations.for_product(product)],
+    })
+
+
+async def cart_view(request):
+    await _prepare(request)
+    cart = Cart(request)
+    await cart.aload()
+    return render(request, 'store/cart.html', {'cart': cart})
@@ -1,19 +1,32 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import User
-from .models import UserProfile
+from . import identifiers
+from .models import LoginIdentifier
 
 class EmailOrPhoneBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Try email
-            user = User.objects.get(email=username)
-        except User.DoesNotExist:
-            # Try phone
-            try:
-                profile = UserProfile.objects.get(phone=username)
-                user = profile.user
-            except UserProfile.DoesNotExist:
-                return None
-        if user.check_password(password):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        # Email, phone and username all resolve through one indexed lookup.
+        keys = identifiers.candidate_keys(username)
+        matches = {
+            row.kind: row.user
+            for row in LoginIdentifier.objects.filter(key__in=keys).select_related('user')
+        }
+        user = next((matches[kind] for kind in identifiers.KIND_PRIORITY if kind in matches), None)
+        unsynced = user is None
+        if unsynced:
+            # Users saved without the signals (loaddata, bulk_create) have no
+            # rows yet: look the username up directly, and add them on sign-in.
+            user = User._default_manager.filter(**{User.USERNAME_FIELD: username}).first()
+        if user is None:
+            # Hash anyway so a miss takes as long as a wrong password.
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            if unsynced:
+                identifiers.sync_user(user)
             return user
-        return None
\ No newline at end of file
+        return None
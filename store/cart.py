@@ -1,55 +1,173 @@
 
 from decimal import Decimal
+from asgiref.sync import sync_to_async
+from . import inventory
+from .cart_storage import CART_SESSION_ID, get_cart_storage
 from .models import Product
 
-CART_SESSION_ID = 'cart'
+
+class CartError(Exception):
+    def __init__(self, errors):
+        super().__init__('; '.join(e['error'] for e in errors))
+        self.errors = errors
+
+
+def fetch_products(product_ids):
+    # The single price/stock lookup shared by every cart mutation.
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+    return Product.objects.filter(id__in=product_ids).only(
+        'id', 'title', 'price', 'in_stock', 'stock_quantity',
+    ).in_bulk()
+
 
 class Cart:
     def __init__(self, request):
-        self.session = request.session
-        cart = self.session.get(CART_SESSION_ID)
-        if not cart:
-            cart = self.session[CART_SESSION_ID] = {}
-        self.cart = cart
+        # Storage is only written on change, so read-only page views don't
+        # create or rewrite anything just to hold an empty cart.
+        self.storage = get_cart_storage(request)
+        self._products = None
+
+    @property
+    def cart(self):
+        return self.storage.lines()
 
     def add(self, product_id, quantity=1, override=False):
-        product_id = str(product_id)
-        if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0, 'price': '0.00'}
-        if override:
-            self.cart[product_id]['quantity'] = quantity
-        else:
-            self.cart[product_id]['quantity'] += quantity
-        product = Product.objects.get(id=product_id)
-        self.cart[product_id]['price'] = str(product.price)
-        self.save()
+        self.apply([{'op': 'set' if override else 'add', 'product_id': product_id, 'quantity': quantity}])
+
+    def apply(self, operations):
+        """
+        Apply a batch of ``{'op': 'add'|'set'|'remove', 'product_id', 'quantity'}``
+        operations with one product lookup. Either every operation is valid
+        and applied, or CartError is raised and the cart is left unchanged.
+        """
+        parsed, errors = [], []
+        for index, operation in enumerate(operations):
+            try:
+                op = operation['op']
+                product_id = int(operation['product_id'])
+                quantity = int(operation.get('quantity', 1))
+            except (KeyError, TypeError, ValueError):
+                errors.append({'index': index, 'error': 'Malformed operation.'})
+                continue
+            if op not in ('add', 'set', 'remove'):
+                errors.append({'index': index, 'error': f'Unknown op {op!r}.'})
+            elif op != 'remove' and (quantity < 0 or (op == 'add' and quantity == 0)):
+                errors.append({'index': index, 'error': 'Quantity must be positive.'})
+            else:
+                parsed.append((index, op, product_id, quantity))
+
+        products = fetch_products(pid for _, op, pid, _ in parsed if op != 'remove')
+        current = self.cart
+        reserving = inventory.reservations_enabled()
+        quantities = {pid: item['quantity'] for pid, item in current.items()}
+        last_index = {}
+        for index, op, product_id, quantity in parsed:
+            key = str(product_id)
+            last_index[product_id] = index
+            if op == 'remove' or (op == 'set' and quantity == 0):
+                quantities.pop(key, None)
+                continue
+            product = products.get(product_id)
+            wanted = quantity if op == 'set' else quantities.get(key, 0) + quantity
+            if product is None:
+                errors.append({'index': index, 'error': f'Unknown product {product_id}.'})
+            elif not product.in_stock and not (reserving and wanted <= quantities.get(key, 0)):
+                errors.append({'index': index, 'error': f'{product.title} is out of stock.'})
+            elif not reserving and product.stock_quantity is not None and wanted > product.stock_quantity:
+                errors.append({'index': index, 'error': f'Only {product.stock_quantity} of {product.title} left.'})
+            else:
+                quantities[key] = wanted
+        if errors:
+            raise CartError(sorted(errors, key=lambda e: e['index']))
+
+        lines, changed = {}, {}
+        count, total = self.storage.summary()
+        for key, quantity in quantities.items():
+            product = products.get(int(key))
+            price = str(product.price) if product is not None else current[key]['price']
+            lines[key] = {'quantity': quantity, 'price': price}
+            if current.get(key) != lines[key]:
+                changed[key] = lines[key]
+        changed.update({key: None for key in current if key not in lines})
+        if not changed:
+            return
+        if reserving:
+            self._reserve(current, lines, changed, products, last_index)
+        # Keep the running count/total from the delta of the touched lines.
+        for key, line in changed.items():
+            old = current.get(key)
+            if old is not None:
+                count -= old['quantity']
+                total -= Decimal(old['price']) * old['quantity']
+            if line is not None:
+                count += line['quantity']
+                total += Decimal(line['price']) * line['quantity']
+        self.storage.save(lines, changed, count, total)
+        self._products = None
+
+    def _reserve(self, current, lines, changed, products, last_index):
+        changes = {}
+        for key in changed:
+            pid = int(key)
+            delta = lines.get(key, {}).get('quantity', 0) - current.get(key, {}).get('quantity', 0)
+            product = products.get(pid)
+            if delta < 0 or (delta > 0 and product is not None and product.stock_quantity is not None):
+                changes[pid] = delta
+        if not changes:
+            return
+        try:
+            inventory.reserve(self.storage.key(create=True), changes)
+        except inventory.InsufficientStock:
+            short = inventory.shortfalls({pid: n for pid, n in changes.items() if n > 0})
+            raise CartError([
+                {'index': last_index.get(pid, 0), 'error': f'Only {left} more of {products[pid].title} available.'}
+                for pid, left in short.items()
+            ] or [{'index': 0, 'error': 'Not enough stock.'}])
 
     def remove(self, product_id):
-        product_id = str(product_id)
-        if product_id in self.cart:
-            del self.cart[product_id]
-            self.save()
+        self.apply([{'op': 'remove', 'product_id': product_id}])
+
+    async def aload(self):
+        # Load everything rendering the cart needs, so templates can iterate
+        # it from async code without touching the database.
+        lines = await sync_to_async(self.storage.lines)()
+        await sync_to_async(self.storage.summary)()
+        self._products = [p async for p in Product.objects.filter(id__in=list(lines))]
 
     def __iter__(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
+        products = self._products
+        if products is None:
+            products = Product.objects.filter(id__in=self.cart.keys())
         for product in products:
-            item = cart[str(product.id)]
+            item = dict(self.cart[str(product.id)])
             item['product'] = product
             item['price'] = Decimal(item['price'])
             item['subtotal'] = item['price'] * item['quantity']
             yield item
 
+    def quantities(self):
+        return {int(pid): item['quantity'] for pid, item in self.cart.items()}
+
+    def summary(self):
+        items = [
+            {
+                'product_id': int(pid),
+                'quantity': item['quantity'],
+                'price': item['price'],
+                'subtotal': str(Decimal(item['price']) * item['quantity']),
+            }
+            for pid, item in self.cart.items()
+        ]
+        return {'items': items, 'item_count': len(self), 'total': str(self.get_total_price())}
+
     def __len__(self):
-        return sum(item['quantity'] for item in self.cart.values())
+        return self.storage.summary()[0]
 
     def get_total_price(self):
-        return sum(Decimal(i['price']) * i['quantity'] for i in self.cart.values())
+        return self.storage.summary()[1]
 
     def clear(self):
-        self.session[CART_SESSION_ID] = {}
-        self.save()
-
-    def save(self):
-        self.session.modified = True
+        self.storage.clear()
+        self._products = None
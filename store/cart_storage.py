@@ -0,0 +1,237 @@
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+CART_SESSION_ID = 'cart'
+CART_META_SESSION_ID = 'cart_meta'
+CART_KEY_SESSION_ID = 'cart_id'
+DEFAULT_BACKEND = 'store.cart_storage.SessionCartStorage'
+
+
+def summarize(lines):
+    count = sum(line['quantity'] for line in lines.values())
+    total = sum((Decimal(line['price']) * line['quantity'] for line in lines.values()), Decimal('0.00'))
+    return count, total
+
+
+class BaseCartStorage:
+    """
+    Where a cart lives. Lines are ``{product_id (str): {'quantity': int,
+    'price': str}}``; the item count and total are stored alongside them and
+    updated by the Cart from deltas, so reading them never walks the lines.
+    """
+
+    def __init__(self, request=None, key=None):
+        self.request = request
+        self._key = key
+        self._lines = None
+        self._summary = None
+
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.load_lines()
+        return self._lines
+
+    def summary(self):
+        if self._summary is None:
+            self._summary = self.load_summary()
+        return self._summary
+
+    def save(self, lines, changed, count, total):
+        """``changed`` maps product ids to their new line, or None if removed."""
+        self.write(lines, changed, count, total)
+        self._lines, self._summary = lines, (count, total)
+
+    def clear(self):
+        self.delete()
+        self._lines, self._summary = {}, (0, Decimal('0.00'))
+
+    def load_lines(self):
+        raise NotImplementedError
+
+    def load_summary(self):
+        return summarize(self.lines())
+
+    def write(self, lines, changed, count, total):
+        raise NotImplementedError
+
+    def delete(self):
+        raise NotImplementedError
+
+    # Keyed backends: anonymous carts are keyed by a random id kept in the
+    # session (written once, on the first change); a logged-in user's cart is
+    # keyed by their id, so it survives logout and follows them across devices.
+
+    @classmethod
+    def user_key(cls, user):
+        return f'user-{user.pk}'
+
+    def key(self, create=False):
+        if self._key is None and self.request is not None:
+            user = getattr(self.request, 'user', None)
+            if user is not None and user.is_authenticated:
+                self._key = self.user_key(user)
+            else:
+                self._key = self.request.session.get(CART_KEY_SESSION_ID)
+                if self._key is None and create:
+                    self._key = uuid.uuid4().hex
+                    self.request.session[CART_KEY_SESSION_ID] = self._key
+        return self._key
+
+    @classmethod
+    def merge_anonymous(cls, request, user):
+        anonymous_key = request.session.get(CART_KEY_SESSION_ID)
+        if not anonymous_key:
+            return
+        source = cls(key=anonymous_key)
+        incoming = source.lines()
+        if not incoming:
+            return
+        target = cls(key=cls.user_key(user))
+        lines = {pid: dict(line) for pid, line in target.lines().items()}
+        changed = {}
+        for pid, line in incoming.items():
+            merged = dict(line)
+            if pid in lines:
+                merged['quantity'] += lines[pid]['quantity']
+            lines[pid] = changed[pid] = merged
+        count, total = summarize(lines)
+        with transaction.atomic():
+            target.save(lines, changed, count, total)
+            source.clear()
+        del request.session[CART_KEY_SESSION_ID]
+
+
+class SessionCartStorage(BaseCartStorage):
+    # The original behaviour: the whole cart is part of the session payload.
+
+    def load_lines(self):
+        return self.request.session.get(CART_SESSION_ID) or {}
+
+    def load_summary(self):
+        meta = self.request.session.get(CART_META_SESSION_ID)
+        if meta is None:
+            # Sessions written before the running totals were stored.
+            return super().load_summary()
+        return meta['count'], Decimal(meta['total'])
+
+    def write(self, lines, changed, count, total):
+        session = self.request.session
+        session[CART_SESSION_ID] = lines
+        session[CART_META_SESSION_ID] = {'count': count, 'total': str(total)}
+        session.modified = True
+
+    def delete(self):
+        session = self.request.session
+        if CART_SESSION_ID in session or CART_META_SESSION_ID in session:
+            session.pop(CART_SESSION_ID, None)
+            session.pop(CART_META_SESSION_ID, None)
+
+    @classmethod
+    def merge_anonymous(cls, request, user):
+        # login() keeps the session data, so the cart simply carries over.
+        return
+
+
+class DatabaseCartStorage(BaseCartStorage):
+    # One header row with the running totals plus one narrow row per line, so
+    # a change rewrites only the lines it touched.
+
+    def load_lines(self):
+        from .models import CartLine
+        key = self.key()
+        if key is None:
+            return {}
+        rows = CartLine.objects.filter(cart_id=key).values_list('product_id', 'quantity', 'price')
+        return {str(pid): {'quantity': qty, 'price': str(price)} for pid, qty, price in rows}
+
+    def load_summary(self):
+        from .models import StoredCart
+        key = self.key()
+        row = StoredCart.objects.filter(key=key).values_list('item_count', 'total').first() if key else None
+        if row is None:
+            return 0, Decimal('0.00')
+        return row[0], row[1]
+
+    def write(self, lines, changed, count, total):
+        from .models import CartLine, StoredCart
+        key = self.key(create=True)
+        removed = [int(pid) for pid, line in changed.items() if line is None]
+        upserts = [
+            CartLine(cart_id=key, product_id=int(pid), quantity=line['quantity'], price=Decimal(line['price']))
+            for pid, line in changed.items() if line is not None
+        ]
+        with transaction.atomic():
+            StoredCart.objects.bulk_create(
+                [StoredCart(key=key, item_count=count, total=total)],
+                update_conflicts=True, unique_fields=['key'], update_fields=['item_count', 'total', 'updated_at'],
+            )
+            if removed:
+                CartLine.objects.filter(cart_id=key, product_id__in=removed).delete()
+            if upserts:
+                CartLine.objects.bulk_create(
+                    upserts, update_conflicts=True,
+                    unique_fields=['cart', 'product'], update_fields=['quantity', 'price'],
+                )
+
+    def delete(self):
+        from .models import CartLine, StoredCart
+        key = self.key()
+        if key is None:
+            return
+        with transaction.atomic():
+            CartLine.objects.filter(cart_id=key).delete()
+            StoredCart.objects.filter(key=key).delete()
+
+
+class CacheCartStorage(BaseCartStorage):
+    # The whole cart as one cache entry; nothing touches the database.
+
+    def _cache(self):
+        return caches[getattr(settings, 'STORE_CART_CACHE_ALIAS', 'default')]
+
+    def _cache_key(self, key):
+        return f'store:cart:{key}'
+
+    def _entry(self):
+        if not hasattr(self, '_cached_entry'):
+            key = self.key()
+            self._cached_entry = (self._cache().get(self._cache_key(key)) if key else None) or {}
+        return self._cached_entry
+
+    def load_lines(self):
+        return self._entry().get('lines', {})
+
+    def load_summary(self):
+        entry = self._entry()
+        return entry.get('count', 0), Decimal(entry.get('total', '0.00'))
+
+    def write(self, lines, changed, count, total):
+        self._cached_entry = {'lines': lines, 'count': count, 'total': str(total)}
+        self._cache().set(
+            self._cache_key(self.key(create=True)), self._cached_entry,
+            getattr(settings, 'STORE_CART_CACHE_TIMEOUT', 60 * 60 * 24 * 30),
+        )
+
+    def delete(self):
+        key = self.key()
+        self._cached_entry = {}
+        if key:
+            self._cache().delete(self._cache_key(key))
+
+
+def get_backend():
+    return import_string(getattr(settings, 'STORE_CART_BACKEND', DEFAULT_BACKEND))
+
+
+def get_cart_storage(request):
+    # One storage per request, so the context processor, the page cache and
+    # the view all share what was loaded.
+    storage = getattr(request, '_cart_storage', None)
+    if storage is None:
+        storage = request._cart_storage = get_backend()(request)
+    return storage
@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.http import Http404
+
+from .models import Category
+
+VERSION_KEY = 'store:catalog:version'
+MODIFIED_KEY = 'store:catalog:modified'
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def _timeout():
+    return getattr(settings, 'STORE_CATALOG_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    # Every cached catalog entry embeds the version in its key, so bumping it
+    # orphans them all at once; stale entries simply age out.
+    cache.set(MODIFIED_KEY, int(time.time()), None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+        return cache.incr(VERSION_KEY)
+
+
+def get_last_modified():
+    # Unix time of the last catalog change, or of the first time anyone asked
+    # if no change has been seen since the cache was emptied.
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        cache.add(MODIFIED_KEY, int(time.time()), None)
+        modified = cache.get(MODIFIED_KEY)
+    return modified
+
+
+def _key(name):
+    return f'store:catalog:{get_version()}:{name}'
+
+
+def get_or_set(name, compute):
+    key = _key(name)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def get_categories():
+    return get_or_set('categories', lambda: list(
+        Category.objects.annotate(product_count=Count('products')).order_by('name')
+    ))
+
+
+def get_category_map():
+    return get_or_set('category_map', lambda: {c.slug: c for c in get_categories()})
+
+
+def get_category(slug):
+    return get_category_map().get(slug)
+
+
+def get_category_or_404(slug):
+    category = get_category(slug)
+    if category is None:
+        raise Http404('No Category matches the given query.')
+    return category
+
+
+def get_category_counts():
+    return {c.id: c.product_count for c in get_categories()}
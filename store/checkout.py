@@ -0,0 +1,89 @@
+from django.db import IntegrityError, transaction
+
+from . import inventory, jobs, tasks
+from .models import Order, OrderItem, Product
+
+ORDER_FIELDS = ('full_name', 'email', 'address', 'city', 'postal_code')
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, unavailable=()):
+        super().__init__(message)
+        self.unavailable = list(unavailable)
+
+
+def find_existing_order(idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(idempotency_key=idempotency_key).first()
+
+
+def place_order(customer, quantities, idempotency_key=None, cart_key=None):
+    """
+    Create a paid order for ``quantities`` ({product_id: quantity}) in one
+    transaction and return ``(order, created)``.
+
+    Lines are re-priced from a single fetch of the products, stock is taken
+    with one conditional UPDATE (see store.inventory) and the lines are
+    written with one bulk insert, so the query count is the same for one
+    line or a hundred. Sales stats and the confirmation email are queued
+    as jobs after the commit (see store.tasks). Units reserved for
+    ``cart_key`` count towards the order. Repeating a call with the same
+    ``idempotency_key`` returns the original order.
+    """
+    quantities = {int(pid): int(qty) for pid, qty in quantities.items() if int(qty) > 0}
+    if not quantities:
+        raise CheckoutError('Your cart is empty.')
+    idempotency_key = idempotency_key or None
+    try:
+        with transaction.atomic():
+            existing = find_existing_order(idempotency_key)
+            if existing is not None:
+                return existing, False
+
+            products = Product.objects.filter(id__in=quantities).only(
+                'id', 'title', 'price', 'category_id', 'in_stock', 'stock_quantity',
+            ).in_bulk()
+            unavailable = [
+                pid for pid in quantities
+                if pid not in products or (products[pid].stock_quantity is None and not products[pid].in_stock)
+            ]
+            if unavailable:
+                raise CheckoutError('Some items in your cart are no longer available.', unavailable)
+
+            held = inventory.consume(cart_key) if cart_key and inventory.reservations_enabled() else {}
+            needed = {
+                pid: qty - held.pop(pid, 0) for pid, qty in quantities.items()
+                if products[pid].stock_quantity is not None
+            }
+            inventory.take({pid: n for pid, n in needed.items() if n > 0})
+            # Holds beyond what was ordered go back on the shelf.
+            held.update({pid: -n for pid, n in needed.items() if n < 0})
+            inventory.give_back(held)
+
+            order = Order.objects.create(
+                paid=True,
+                idempotency_key=idempotency_key,
+                total=sum(products[pid].price * qty for pid, qty in quantities.items()),
+                item_count=sum(quantities.values()),
+                **{field: customer[field] for field in ORDER_FIELDS},
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[pid], price=products[pid].price, quantity=qty)
+                for pid, qty in quantities.items()
+            ])
+            # Stats and mail happen in the background once the order is committed.
+            jobs.enqueue_on_commit(tasks.record_order_stats, order_id=order.pk, dedupe_key=f'order-stats:{order.pk}')
+            jobs.enqueue_on_commit(tasks.send_order_confirmation, order_id=order.pk,
+                                   dedupe_key=f'order-confirmation:{order.pk}')
+    except inventory.InsufficientStock:
+        short = inventory.shortfalls({pid: n for pid, n in needed.items() if n > 0})
+        details = ', '.join(f'{products[pid].title} ({left} left)' for pid, left in short.items())
+        raise CheckoutError(f'Not enough stock for {details or "some items in your cart"}.', short)
+    except IntegrityError:
+        # A concurrent submit with the same key won the race.
+        existing = find_existing_order(idempotency_key)
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    # store.sessions queues writes per process, so every process has to read
+    # sessions from the same cache or one overwrites another's changes.
+    if settings.SESSION_ENGINE != 'store.sessions' or settings.DEBUG:
+        return []
+    alias = getattr(settings, 'STORE_SESSION_CACHE', 'default')
+    if not isinstance(caches[alias], LocMemCache):
+        return []
+    return [Error(
+        f'The {alias!r} cache used by store.sessions is a per-process LocMemCache.',
+        hint='Point STORE_SESSION_CACHE at a cache shared by all worker processes (Redis, Memcached), '
+             'or use another SESSION_ENGINE.',
+        id='store.E001',
+    )]
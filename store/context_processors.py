@@ -1,8 +1,16 @@
-
 from .cart import Cart
+from .page_cache import CART_BADGE_PLACEHOLDER, CSRF_PLACEHOLDER, is_placeholder_render
 
 def cart_item_count(request):
+    if is_placeholder_render(request):
+        return {'cart_item_count': 0}
     try:
         return {'cart_item_count': len(Cart(request))}
     except Exception:
         return {'cart_item_count': 0}
+
+def page_cache_placeholders(request):
+    # Must run after the built-in csrf processor so its token is overridden.
+    if is_placeholder_render(request):
+        return {'csrf_token': CSRF_PLACEHOLDER, 'cart_badge_placeholder': CART_BADGE_PLACEHOLDER}
+    return {}
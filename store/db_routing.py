@@ -0,0 +1,95 @@
+"""
+Primary/replica routing for the catalog.
+
+Reads of the catalog models go to the STORE_REPLICA_DATABASE alias when it
+is configured; everything else, and every write, goes to ``default``. To
+keep read-your-writes, catalog reads stay on the primary:
+
+* inside a transaction on the primary (e.g. the locked product fetch at
+  checkout),
+* for the rest of a request that wrote a catalog model, and
+* for STORE_REPLICA_PIN_SECONDS afterwards, via a cookie set by
+  ReplicaPinningMiddleware, so the page a form redirects to sees the change.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'store_pin_primary'
+DEFAULT_PIN_SECONDS = 5
+REPLICATED_MODELS = {'store.product', 'store.category', 'store.productsearchentry'}
+
+_request_state = ContextVar('store_replica_state', default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, 'STORE_REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def _is_replicated(model):
+    return model._meta.label_lower in REPLICATED_MODELS
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = replica_alias()
+        if replica is None or not _is_replicated(model):
+            return DEFAULT_DB_ALIAS
+        state = _request_state.get()
+        if (state is not None and state['pinned']) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and _is_replicated(model):
+            state['pinned'] = state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, never migrated on its own.
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        if replica_alias() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'pinned': request.COOKIES.get(PIN_COOKIE) == '1', 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote']:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'STORE_REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def apply_sqlite_pragmas(connection):
+    # PRAGMAs are per connection (journal_mode=WAL also sticks to the file),
+    # so they are issued each time Django opens one.
+    pragmas = getattr(settings, 'STORE_SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,143 @@
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+from django.utils.http import urlencode
+
+from . import catalog_cache
+from .models import Product
+from .search import search_products
+
+SORTS = {
+    'newest': ('Newest', ('-created_at', 'id')),
+    'price_asc': ('Price: low to high', ('price', 'id')),
+    'price_desc': ('Price: high to low', ('-price', '-id')),
+    'name': ('Name', ('title', 'id')),
+}
+RELEVANCE = ('Relevance', ('search_rank', 'id'))
+PRICE_BUCKETS = ((0, 25), (25, 50), (50, 100), (100, 250), (250, 500), (500, None))
+TRUE_VALUES = ('1', 'on', 'true')
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
+class ProductFilters:
+    """
+    The product_list filters read from the query string: ``q``, repeated
+    ``category`` slugs (plus the one in the URL, if any), ``min_price`` /
+    ``max_price``, ``in_stock=1`` and ``sort``.
+
+    Facet counts follow the usual convention that a facet ignores its own
+    selection, so each option's count is what choosing it would show. They
+    take one grouped query per facet and are cached under the catalog
+    version, so a warm page never recounts.
+    """
+
+    def __init__(self, params, category=None):
+        self.params = params
+        self.query = (params.get('q') or '').strip()
+        slugs = params.getlist('category') if hasattr(params, 'getlist') else []
+        categories = [category] if category is not None else []
+        for slug in slugs:
+            found = catalog_cache.get_category(slug)
+            if found is not None and found not in categories:
+                categories.append(found)
+        self.categories = categories
+        self.min_price = _parse_price(params.get('min_price'))
+        self.max_price = _parse_price(params.get('max_price'))
+        self.in_stock = (params.get('in_stock') or '').lower() in TRUE_VALUES
+        sort = params.get('sort')
+        if sort not in SORTS and not (sort == 'relevance' and self.query):
+            sort = 'relevance' if self.query else 'newest'
+        self.sort = sort
+
+    @property
+    def ordering(self):
+        return (RELEVANCE if self.sort == 'relevance' else SORTS[self.sort])[1]
+
+    def sort_options(self):
+        options = [('relevance', RELEVANCE[0])] if self.query else []
+        return options + [(key, label) for key, (label, _) in SORTS.items()]
+
+    def apply(self, queryset, skip=()):
+        if self.categories and 'category' not in skip:
+            queryset = queryset.filter(category__in=[c.id for c in self.categories])
+        if 'price' not in skip:
+            if self.min_price is not None:
+                queryset = queryset.filter(price__gte=self.min_price)
+            if self.max_price is not None:
+                queryset = queryset.filter(price__lte=self.max_price)
+        if self.in_stock and 'in_stock' not in skip:
+            queryset = queryset.filter(in_stock=True)
+        return queryset
+
+    def base_queryset(self):
+        products = Product.objects.all()
+        if self.query:
+            products = search_products(products, self.query)
+        return products
+
+    def products(self):
+        return self.apply(self.base_queryset())
+
+    def _cache_name(self):
+        state = '|'.join([
+            self.query, ','.join(str(c.id) for c in sorted(self.categories, key=lambda c: c.id)),
+            str(self.min_price), str(self.max_price), str(self.in_stock),
+        ])
+        return 'facets:' + hashlib.md5(state.encode()).hexdigest()
+
+    def _compute_counts(self):
+        base = self.base_queryset().order_by()
+        by_category = dict(
+            self.apply(base, skip=('category',)).values_list('category_id').annotate(n=Count('id'))
+        )
+        price = self.apply(base, skip=('price',)).aggregate(**{
+            f'b{i}': Count('id', filter=Q(price__gte=low, **({'price__lt': high} if high else {})))
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        })
+        in_stock = self.apply(base, skip=('in_stock',)).filter(in_stock=True).count()
+        return {
+            'categories': by_category,
+            'price': [price[f'b{i}'] for i in range(len(PRICE_BUCKETS))],
+            'in_stock': in_stock,
+        }
+
+    def counts(self):
+        return catalog_cache.get_or_set(self._cache_name(), self._compute_counts)
+
+    def _url(self, **changes):
+        params = [(k, v) for k, values in self.params.lists() for v in values
+                  if k not in changes and k not in ('page', 'cursor')] if hasattr(self.params, 'lists') else []
+        params += [(k, v) for k, v in changes.items() if v not in (None, '')]
+        return '?' + urlencode(params)
+
+    def facets(self):
+        counts = self.counts()
+        selected = {c.id for c in self.categories}
+        categories = [
+            {'category': c, 'count': counts['categories'].get(c.id, 0), 'selected': c.id in selected}
+            for c in catalog_cache.get_categories()
+        ]
+        prices = []
+        for (low, high), count in zip(PRICE_BUCKETS, counts['price']):
+            # Buckets are [low, high); the link's max_price is inclusive.
+            top = Decimal(high) - Decimal('0.01') if high else None
+            prices.append({
+                'label': f'${low}–${high}' if high else f'${low}+',
+                'count': count,
+                'selected': self.min_price == low and self.max_price == top,
+                'url': self._url(min_price=low, max_price=top),
+            })
+        return {
+            'categories': categories,
+            'prices': prices,
+            'in_stock': counts['in_stock'],
+            'clear_price_url': self._url(min_price=None, max_price=None),
+        }
@@ -0,0 +1,295 @@
+"""
+Sitemaps and the shopping feed (CSV and XML) for the whole catalog.
+
+In-stock products are split into chunks by id range
+(``STORE_FEED_CHUNK_SIZE`` ids each), which new products never reshuffle.
+Everything is streamed from ``iterator()`` so memory stays flat whatever
+the catalog size.
+
+generate() writes the files under STORE_FEED_ROOT, gzipped:
+
+* ``sitemap.xml.gz``: the index, pointing at ``sitemap-pages.xml.gz`` and
+  one ``sitemap-products-<n>.xml.gz`` per chunk;
+* ``products.csv.gz`` / ``products.xml.gz``: the feeds. Gzip allows a file
+  of several members, so each is the per-chunk parts under ``parts/``
+  joined byte for byte, between a header and a footer member.
+
+A manifest records each chunk's product count and latest ``updated_at``,
+so a later run rewrites only the chunks whose signature moved (deletions
+and sell-outs change the count). A new base URL, chunk size or any category change
+rewrites everything. The views serve these files when they exist and
+stream the same output live when they don't.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Category, Product
+
+DEFAULT_CHUNK_SIZE = 10000
+ITERATOR_CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+SLUG_PLACEHOLDER = 'store-feed-slug'
+
+SITEMAP_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+SITEMAP_TAIL = '</urlset>\n'
+INDEX_HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_TAIL = '</sitemapindex>\n'
+CSV_COLUMNS = ['id', 'title', 'description', 'link', 'image_link', 'price', 'availability', 'product_type']
+XML_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+)
+XML_TAIL = '</channel>\n</rss>\n'
+
+
+def chunk_size():
+    return getattr(settings, 'STORE_FEED_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def feed_root():
+    return Path(getattr(settings, 'STORE_FEED_ROOT', None) or Path(settings.MEDIA_ROOT) / 'feeds')
+
+
+def listed():
+    # Out of stock products have no page (product_detail 404s), so they are
+    # left out of the sitemaps and feeds alike.
+    return Product.objects.filter(in_stock=True)
+
+
+def products(chunk=None):
+    queryset = listed().select_related('category').order_by('id')
+    if chunk is not None:
+        size = chunk_size()
+        queryset = queryset.filter(id__gt=chunk * size, id__lte=(chunk + 1) * size)
+    return queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def chunk_signatures():
+    """``{chunk: 'count:latest updated_at'}`` for every non-empty chunk, in one grouped query."""
+    rows = (
+        listed().annotate(chunk=ExpressionWrapper((F('id') - 1) / chunk_size(), output_field=IntegerField()))
+        .values('chunk').annotate(n=Count('id'), last=Max('updated_at')).order_by('chunk')
+    )
+    return {row['chunk']: f'{row["n"]}:{row["last"].isoformat()}' for row in rows}
+
+
+def categories_digest():
+    rows = Category.objects.order_by('id').values_list('id', 'slug', 'name')
+    return hashlib.md5(repr(list(rows)).encode()).hexdigest()
+
+
+def _buffered(pieces):
+    # Fewer, larger writes for the response and the gzip stream.
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+class Renderer:
+    """One product as a sitemap ``<url>``, a CSV line and an RSS ``<item>``."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        # One reverse() instead of one per product.
+        self.product_url = self.base_url + reverse('store:product_detail', args=[SLUG_PLACEHOLDER])
+        self.currency = getattr(settings, 'STORE_CURRENCY', 'USD')
+        self._csv_buffer = io.StringIO()
+        self._csv = csv.writer(self._csv_buffer)
+
+    def link(self, product):
+        return self.product_url.replace(SLUG_PLACEHOLDER, product.slug)
+
+    def image_link(self, product):
+        return self.base_url + product.image.url if product.image else ''
+
+    def sitemap_entry(self, product):
+        return (f'<url><loc>{escape(self.link(product))}</loc>'
+                f'<lastmod>{product.updated_at.date().isoformat()}</lastmod></url>\n')
+
+    def csv_header(self):
+        return self._csv_line(CSV_COLUMNS)
+
+    def csv_line(self, product):
+        return self._csv_line([
+            product.id, product.title, product.description, self.link(product), self.image_link(product),
+            f'{product.price} {self.currency}', 'in stock' if product.in_stock else 'out of stock',
+            product.category.name,
+        ])
+
+    def _csv_line(self, values):
+        self._csv.writerow(values)
+        line = self._csv_buffer.getvalue()
+        self._csv_buffer.seek(0)
+        self._csv_buffer.truncate()
+        return line
+
+    def xml_item(self, product):
+        image = self.image_link(product)
+        return (
+            '<item>'
+            f'<g:id>{product.id}</g:id>'
+            f'<title>{escape(product.title)}</title>'
+            f'<description>{escape(product.description)}</description>'
+            f'<link>{escape(self.link(product))}</link>'
+            + (f'<g:image_link>{escape(image)}</g:image_link>' if image else '')
+            + f'<g:price>{product.price} {self.currency}</g:price>'
+            f'<g:availability>{"in stock" if product.in_stock else "out of stock"}</g:availability>'
+            f'<g:product_type>{escape(product.category.name)}</g:product_type>'
+            '</item>\n'
+        )
+
+
+def pages_sitemap(base_url):
+    base_url = base_url.rstrip('/')
+    paths = [reverse('store:home'), reverse('store:product_list')]
+    paths += [reverse('store:category', args=[slug]) for slug in Category.objects.order_by('id').values_list('slug', flat=True)]
+    yield SITEMAP_HEAD
+    for path in paths:
+        yield f'<url><loc>{escape(base_url + path)}</loc></url>\n'
+    yield SITEMAP_TAIL
+
+
+def sitemap_index(base_url, signatures):
+    base_url = base_url.rstrip('/')
+    yield INDEX_HEAD
+    yield f'<sitemap><loc>{escape(base_url + reverse("store:sitemap_pages"))}</loc></sitemap>\n'
+    for chunk, signature in signatures.items():
+        lastmod = signature.split(':', 1)[1]
+        location = base_url + reverse('store:sitemap_products', args=[chunk])
+        yield f'<sitemap><loc>{escape(location)}</loc><lastmod>{lastmod}</lastmod></sitemap>\n'
+    yield INDEX_TAIL
+
+
+def stream_sitemap(base_url, chunk):
+    renderer = Renderer(base_url)
+    yield SITEMAP_HEAD
+    yield from _buffered(renderer.sitemap_entry(product) for product in products(chunk))
+    yield SITEMAP_TAIL
+
+
+def stream_feed(base_url, fmt):
+    renderer = Renderer(base_url)
+    if fmt == 'csv':
+        yield renderer.csv_header()
+        yield from _buffered(renderer.csv_line(product) for product in products())
+    else:
+        yield XML_HEAD
+        yield from _buffered(renderer.xml_item(product) for product in products())
+        yield XML_TAIL
+
+
+# Generated files.
+
+def _write_gzip(path, pieces):
+    tmp = path.with_name(path.name + '.tmp')
+    with gzip.open(tmp, 'wt', encoding='utf-8') as fh:
+        for piece in pieces:
+            fh.write(piece)
+    os.replace(tmp, path)
+
+
+def _concatenate(path, members):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as out:
+        for member in members:
+            with open(member, 'rb') as fh:
+                shutil.copyfileobj(fh, out)
+    os.replace(tmp, path)
+
+
+def _write_chunk(root, renderer, chunk):
+    # One pass over the chunk feeds all three outputs.
+    parts = root / 'parts'
+    tmp_paths = {kind: parts / f'{kind}-{chunk}.gz.tmp' for kind in ('sitemap', 'csv', 'xml')}
+    files = {kind: gzip.open(path, 'wt', encoding='utf-8') for kind, path in tmp_paths.items()}
+    try:
+        files['sitemap'].write(SITEMAP_HEAD)
+        for product in products(chunk):
+            files['sitemap'].write(renderer.sitemap_entry(product))
+            files['csv'].write(renderer.csv_line(product))
+            files['xml'].write(renderer.xml_item(product))
+        files['sitemap'].write(SITEMAP_TAIL)
+    finally:
+        for fh in files.values():
+            fh.close()
+    os.replace(tmp_paths['sitemap'], root / f'sitemap-products-{chunk}.xml.gz')
+    os.replace(tmp_paths['csv'], parts / f'csv-{chunk}.gz')
+    os.replace(tmp_paths['xml'], parts / f'xml-{chunk}.gz')
+
+
+def _remove_chunk(root, chunk):
+    for path in (root / f'sitemap-products-{chunk}.xml.gz', root / 'parts' / f'csv-{chunk}.gz',
+                 root / 'parts' / f'xml-{chunk}.gz'):
+        path.unlink(missing_ok=True)
+
+
+def generate(base_url, full=False):
+    """
+    Bring the files under feed_root() up to date and return the chunks
+    that were ``(rewritten, unchanged, removed)``.
+    """
+    root = feed_root()
+    (root / 'parts').mkdir(parents=True, exist_ok=True)
+    manifest_path = root / 'manifest.json'
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        manifest = {}
+    settings_state = {'base_url': base_url, 'chunk_size': chunk_size(), 'categories': categories_digest()}
+    if any(manifest.get(key) != value for key, value in settings_state.items()):
+        full = True
+    previous = {} if full else {int(chunk): sig for chunk, sig in manifest.get('chunks', {}).items()}
+
+    signatures = chunk_signatures()
+    renderer = Renderer(base_url)
+    rewritten, unchanged = [], []
+    for chunk, signature in signatures.items():
+        if previous.get(chunk) == signature and (root / f'sitemap-products-{chunk}.xml.gz').exists():
+            unchanged.append(chunk)
+            continue
+        _write_chunk(root, renderer, chunk)
+        rewritten.append(chunk)
+    removed = [int(chunk) for chunk in manifest.get('chunks', {}) if int(chunk) not in signatures]
+    for chunk in removed:
+        _remove_chunk(root, chunk)
+
+    _write_gzip(root / 'sitemap-pages.xml.gz', pages_sitemap(base_url))
+    _write_gzip(root / 'sitemap.xml.gz', sitemap_index(base_url, signatures))
+    parts = root / 'parts'
+    _write_gzip(parts / 'csv-head.gz', [renderer.csv_header()])
+    _write_gzip(parts / 'xml-head.gz', [XML_HEAD])
+    _write_gzip(parts / 'xml-tail.gz', [XML_TAIL])
+    _concatenate(root / 'products.csv.gz', [parts / 'csv-head.gz'] + [parts / f'csv-{c}.gz' for c in signatures])
+    _concatenate(root / 'products.xml.gz',
+                 [parts / 'xml-head.gz'] + [parts / f'xml-{c}.gz' for c in signatures] + [parts / 'xml-tail.gz'])
+
+    manifest_tmp = manifest_path.with_name('manifest.json.tmp')
+    manifest_tmp.write_text(json.dumps({
+        **settings_state, 'generated_at': timezone.now().isoformat(),
+        'chunks': {str(chunk): signature for chunk, signature in signatures.items()},
+    }, indent=2))
+    os.replace(manifest_tmp, manifest_path)
+    return rewritten, unchanged, removed
+
+
+def generated_file(name):
+    path = feed_root() / name
+    return path if path.is_file() else None
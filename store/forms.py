@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.models import User
+from .identifiers import EMAIL, PHONE, is_taken, normalize_phone
 
 class UserRegisterForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput, required=True)
@@ -27,6 +28,14 @@ class UserRegisterForm(forms.ModelForm):
         if not email and not phone:
             raise forms.ValidationError("At least one of Email or Phone number is required.")
 
+        if phone and not normalize_phone(phone):
+            self.add_error('phone', "Enter a valid phone number.")
+        # Each email/phone must identify exactly one account to log in with.
+        if email and is_taken(EMAIL, email):
+            self.add_error('email', "An account with this email already exists.")
+        if phone and is_taken(PHONE, phone):
+            self.add_error('phone', "An account with this phone number already exists.")
+
         if password and confirm_password and password != confirm_password:
             self.add_error('confirm_password', "Passwords do not match.")
 
@@ -38,6 +47,7 @@ class CheckoutForm(forms.Form):
     address = forms.CharField(max_length=300)
     city = forms.CharField(max_length=120)
     postal_code = forms.CharField(max_length=20)
+    idempotency_key = forms.CharField(max_length=64, required=False, widget=forms.HiddenInput)
 
 class EmailOrPhoneLoginForm(forms.Form):
     username = forms.CharField(label="Email or Phone")
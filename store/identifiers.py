@@ -0,0 +1,129 @@
+import itertools
+import re
+
+from django.conf import settings
+
+EMAIL = 'email'
+PHONE = 'phone'
+USERNAME = 'username'
+# When one input matches several identifiers, the more specific kind wins.
+KIND_PRIORITY = (EMAIL, PHONE, USERNAME)
+
+_PHONE_CHARS_RE = re.compile(r'^[\d\s()+.\-]+$')
+
+
+def normalize_email(value):
+    value = (value or '').strip()
+    if '@' not in value:
+        return ''
+    return value.lower()
+
+
+def normalize_phone(value):
+    # Best-effort E.164: keep the digits, honour an explicit +/00 country
+    # prefix, otherwise assume STORE_DEFAULT_PHONE_COUNTRY_CODE.
+    value = (value or '').strip()
+    if not value or not _PHONE_CHARS_RE.match(value):
+        return ''
+    digits = re.sub(r'\D', '', value)
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = getattr(settings, 'STORE_DEFAULT_PHONE_COUNTRY_CODE', '1') + digits.lstrip('0')
+    if not 8 <= len(digits) <= 15:
+        return ''
+    return '+' + digits
+
+
+def make_key(kind, value):
+    return f'{kind}:{value}'
+
+
+def candidate_keys(identifier):
+    identifier = (identifier or '').strip()
+    keys = []
+    email = normalize_email(identifier)
+    if email:
+        keys.append(make_key(EMAIL, email))
+    phone = normalize_phone(identifier)
+    if phone:
+        keys.append(make_key(PHONE, phone))
+    if identifier:
+        keys.append(make_key(USERNAME, identifier))
+    return keys
+
+
+def user_keys(user, phone=None):
+    keys = {USERNAME: make_key(USERNAME, user.username)}
+    email = normalize_email(user.email)
+    if email:
+        keys[EMAIL] = make_key(EMAIL, email)
+    phone = normalize_phone(phone)
+    if phone:
+        keys[PHONE] = make_key(PHONE, phone)
+    return keys
+
+
+def is_taken(kind, value, exclude_user=None):
+    from .models import LoginIdentifier
+    normalized = normalize_email(value) if kind == EMAIL else normalize_phone(value)
+    if not normalized:
+        return False
+    rows = LoginIdentifier.objects.filter(key=make_key(kind, normalized))
+    if exclude_user is not None:
+        rows = rows.exclude(user=exclude_user)
+    return rows.exists()
+
+
+def sync_user(user, phone=None, kinds=(USERNAME, EMAIL)):
+    """
+    Bring ``user``'s rows for ``kinds`` in line with their current username,
+    email and ``phone``. A key already owned by another user is left alone,
+    so the first account to claim an email or phone keeps it.
+    """
+    from .models import LoginIdentifier
+    wanted = {kind: key for kind, key in user_keys(user, phone).items() if kind in kinds}
+    existing = {row.kind: row for row in LoginIdentifier.objects.filter(user=user, kind__in=kinds)}
+    stale = [row.pk for kind, row in existing.items() if wanted.get(kind) != row.key]
+    if stale:
+        LoginIdentifier.objects.filter(pk__in=stale).delete()
+    new = [
+        LoginIdentifier(key=key, kind=kind, user=user)
+        for kind, key in wanted.items()
+        if kind not in existing or existing[kind].key != key
+    ]
+    if new:
+        LoginIdentifier.objects.bulk_create(new, ignore_conflicts=True)
+
+
+def rebuild(batch_size=1000):
+    """
+    Sync every user's rows, oldest account first, for users written without
+    the save signals (loaddata, bulk_create, QuerySet.update()). Returns how
+    many users were checked.
+    """
+    from django.contrib.auth.models import User
+    from .models import LoginIdentifier, UserProfile
+    users = User.objects.order_by('pk').only('pk', 'username', 'email').iterator(chunk_size=batch_size)
+    checked = 0
+    while batch := list(itertools.islice(users, batch_size)):
+        ids = [user.pk for user in batch]
+        phones = dict(UserProfile.objects.filter(user_id__in=ids).values_list('user_id', 'phone'))
+        wanted = {user.pk: user_keys(user, phones.get(user.pk)) for user in batch}
+        existing = LoginIdentifier.objects.filter(user_id__in=ids).values_list('pk', 'user_id', 'kind', 'key')
+        stale, present = [], set()
+        for pk, user_id, kind, key in existing:
+            if wanted[user_id].get(kind) == key:
+                present.add(key)
+            else:
+                stale.append(pk)
+        if stale:
+            LoginIdentifier.objects.filter(pk__in=stale).delete()
+        LoginIdentifier.objects.bulk_create([
+            LoginIdentifier(key=key, kind=kind, user_id=user_id)
+            for user_id, keys in wanted.items() for kind, key in keys.items() if key not in present
+        ], ignore_conflicts=True)
+        checked += len(batch)
+    return checked
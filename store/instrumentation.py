@@ -0,0 +1,269 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNMATCHED = 'unmatched'
+# Transaction bookkeeping repeats legitimately and isn't worth flagging.
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT')
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+_current = ContextVar('store_request_profile', default=None)
+
+
+def query_shape(sql):
+    # Same statement modulo literal values and IN-list length.
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _STRING_RE.sub('?', sql)
+    return _NUMBER_RE.sub('?', sql)
+
+
+class RequestProfile:
+    """Where one sampled request spent its time."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.view_time = 0.0
+        self.view_started = None
+        self.shapes = Counter()
+        self._rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # A connection.execute_wrapper: runs around every query.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+            if not sql.lstrip().upper().startswith(IGNORED_PREFIXES):
+                self.shapes[query_shape(sql)] += 1
+
+    def repeated_queries(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # Time the outermost render of each sampled request; includes
+        # nested inside it are part of the same measurement.
+        profile = _current.get()
+        if profile is None or profile._rendering:
+            return super().render(context, request)
+        profile._rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+            profile._rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with renders counted towards the sampled
+    request's template time. Set as the TEMPLATES backend; with the stock
+    backend the template time stays at zero.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, view, value):
+        series = self.series.get(view)
+        if series is None:
+            # One count per bucket, then the sum and the total count.
+            series = self.series[view] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for view, series in sorted(self.series.items()):
+            label = f'view="{_escape(view)}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{label}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{label}}} {series[-1]}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = {}
+
+    def inc(self, view, amount=1):
+        self.series[view] = self.series.get(view, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for view, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{view="{_escape(view)}"}} {value}')
+        return lines
+
+
+class Registry:
+    """
+    Per-process metrics. Under a multi-worker server each worker reports its
+    own numbers; Prometheus sums them across scrape targets.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Histogram('store_request_duration_seconds', 'Time spent handling the request.', SECONDS_BUCKETS)
+        self.db = Histogram('store_request_db_seconds', 'Time spent in SQL (sampled requests).', SECONDS_BUCKETS)
+        self.templates = Histogram('store_request_template_seconds', 'Time spent rendering templates (sampled requests).', SECONDS_BUCKETS)
+        self.views = Histogram('store_request_view_seconds', 'Time spent in the view (sampled requests).', SECONDS_BUCKETS)
+        self.queries = Histogram('store_request_queries', 'SQL queries per request (sampled requests).', QUERY_BUCKETS)
+        self.n_plus_one = CounterMetric('store_n_plus_one_total', 'Sampled requests that repeated a query shape.')
+        # Callables returning extra exposition lines, read at scrape time
+        # (e.g. the job queue gauges from store.jobs).
+        self.collectors = []
+
+    def observe(self, view, duration, profile=None):
+        with self.lock:
+            self.requests.observe(view, duration)
+            if profile is not None:
+                self.db.observe(view, profile.db_time)
+                self.templates.observe(view, profile.template_time)
+                self.views.observe(view, profile.view_time)
+                self.queries.observe(view, profile.query_count)
+
+    def flag_n_plus_one(self, view):
+        with self.lock:
+            self.n_plus_one.inc(view)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.requests, self.db, self.templates, self.views, self.queries, self.n_plus_one):
+                lines += metric.render()
+        for collector in self.collectors:
+            try:
+                lines += collector()
+            except Exception:
+                logger.exception('Metrics collector %r failed', collector)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNMATCHED
+
+
+class InstrumentationMiddleware:
+    """
+    Records request time for every request and, for a sampled fraction
+    (STORE_INSTRUMENTATION_SAMPLE_RATE), SQL count and time, template time
+    and view time. Sampled responses get a Server-Timing header, and query
+    shapes repeated STORE_N_PLUS_ONE_THRESHOLD times are logged as a likely
+    N+1. Everything feeds the histograms served at /metrics. Put it first
+    in MIDDLEWARE so its timings cover the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'STORE_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        sample_rate = getattr(settings, 'STORE_INSTRUMENTATION_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        if sample_rate < 1 and random.random() >= sample_rate:
+            response = self.get_response(request)
+            view = _view_name(request)
+            if view != 'store:metrics':
+                registry.observe(view, time.perf_counter() - started)
+            return response
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        # Without process_view a middleware answered before any view ran.
+        profile.view_time = time.perf_counter() - (profile.view_started or started)
+        view = _view_name(request)
+        if view == 'store:metrics':
+            return response
+        duration = time.perf_counter() - started
+        registry.observe(view, duration, profile)
+
+        repeated = profile.repeated_queries(getattr(settings, 'STORE_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD))
+        if repeated:
+            registry.flag_n_plus_one(view)
+            shape, count = repeated[0]
+            logger.warning('Possible N+1 in %s: %d queries shaped like %s', view, count, shape)
+        if getattr(settings, 'STORE_SERVER_TIMING', True):
+            response.headers['Server-Timing'] = profile.server_timing(duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+        return None
+
+
+def render_metrics():
+    return registry.render()
@@ -0,0 +1,168 @@
+"""
+Stock quantities.
+
+Stock only ever moves through single conditional UPDATEs (``SET
+stock_quantity = stock_quantity - n WHERE stock_quantity >= n``), so
+concurrent checkouts of the same product can't oversell it and only lock
+the rows they touch. A batch of products is one statement, with the
+per-product amounts in a CASE. ``in_stock`` is rewritten in the same
+statement, so it always matches the quantity.
+
+With STORE_STOCK_RESERVATIONS on, adding to the cart takes the units
+straight away and records a StockReservation for the cart; checkout uses
+what the cart holds and takes only the rest. Reservations that reach
+``expires_at`` are given back by release_expired().
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import Product, StockReservation
+
+DEFAULT_RESERVATION_SECONDS = 15 * 60
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def reservations_enabled():
+    return getattr(settings, 'STORE_STOCK_RESERVATIONS', False)
+
+
+def reservation_expiry():
+    seconds = getattr(settings, 'STORE_RESERVATION_SECONDS', DEFAULT_RESERVATION_SECONDS)
+    return timezone.now() + datetime.timedelta(seconds=seconds)
+
+
+def _amounts(quantities):
+    return Case(*[When(pk=pid, then=Value(qty)) for pid, qty in quantities.items()],
+                output_field=IntegerField())
+
+
+def take(quantities):
+    """
+    Remove ``quantities`` ({product_id: units}) of tracked products from
+    stock, all or nothing. Raises InsufficientStock if any product is short;
+    the rows that were updated are rolled back with the caller's transaction.
+    """
+    if not quantities:
+        return
+    amount = _amounts(quantities)
+    updated = Product.objects.filter(pk__in=quantities, stock_quantity__gte=amount).update(
+        stock_quantity=F('stock_quantity') - amount,
+        in_stock=Case(When(stock_quantity__gt=amount, then=Value(True)), default=Value(False)),
+        updated_at=Now(),
+    )
+    if updated != len(quantities):
+        raise InsufficientStock
+    if Product.objects.filter(pk__in=quantities, in_stock=False).exists():
+        # Something sold out; listings and facet counts show in_stock.
+        transaction.on_commit(catalog_cache.bump_version)
+
+
+def give_back(quantities):
+    """Return units to stock (a cancelled hold or expired reservation)."""
+    if not quantities:
+        return
+    products = Product.objects.filter(pk__in=quantities, stock_quantity__isnull=False)
+    if products.filter(in_stock=False).exists():
+        transaction.on_commit(catalog_cache.bump_version)
+    amount = _amounts(quantities)
+    products.update(stock_quantity=F('stock_quantity') + amount, in_stock=True, updated_at=Now())
+
+
+def shortfalls(quantities):
+    """The products in ``quantities`` with fewer units than asked for, and how many they have."""
+    available = dict(Product.objects.filter(pk__in=quantities).values_list('id', 'stock_quantity'))
+    return {
+        pid: available.get(pid) or 0 for pid, qty in quantities.items()
+        if pid not in available or (available[pid] is not None and available[pid] < qty)
+    }
+
+
+def reserve(cart_key, changes):
+    """
+    Adjust what ``cart_key`` holds by ``changes`` ({product_id: +/-units}).
+    Increases are taken from stock (tracked products only; the caller
+    filters); decreases give back at most what is held. Every hold of the
+    cart gets a fresh expiry. Raises InsufficientStock, holding nothing new.
+    """
+    wanted = {pid: n for pid, n in changes.items() if n > 0}
+    with transaction.atomic():
+        held = dict(StockReservation.objects.select_for_update().filter(
+            cart_key=cart_key, product_id__in=changes,
+        ).values_list('product_id', 'quantity'))
+        take(wanted)
+        released = {pid: min(-n, held[pid]) for pid, n in changes.items() if n < 0 and held.get(pid)}
+        give_back(released)
+
+        expires_at = reservation_expiry()
+        new_totals = {pid: held.get(pid, 0) + wanted.get(pid, 0) - released.get(pid, 0) for pid in changes}
+        empty = [pid for pid, total in new_totals.items() if total <= 0 and pid in held]
+        if empty:
+            StockReservation.objects.filter(cart_key=cart_key, product_id__in=empty).delete()
+        rows = [StockReservation(cart_key=cart_key, product_id=pid, quantity=total, expires_at=expires_at)
+                for pid, total in new_totals.items() if total > 0]
+        if rows:
+            StockReservation.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['cart_key', 'product'],
+                update_fields=['quantity', 'expires_at'],
+            )
+        StockReservation.objects.filter(cart_key=cart_key).update(expires_at=expires_at)
+
+
+def consume(cart_key):
+    """Delete ``cart_key``'s reservations and return what they held, as {product_id: units}."""
+    rows = list(StockReservation.objects.select_for_update().filter(cart_key=cart_key)
+                .values_list('pk', 'product_id', 'quantity'))
+    if not rows:
+        return {}
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    held = {}
+    for _, pid, qty in rows:
+        held[pid] = held.get(pid, 0) + qty
+    return held
+
+
+def transfer(old_key, new_key):
+    # A cart changing hands at login; holds on the same product add up.
+    if not old_key or old_key == new_key:
+        return
+    with transaction.atomic():
+        moving = consume(old_key)
+        if not moving:
+            return
+        held = dict(StockReservation.objects.filter(cart_key=new_key, product_id__in=moving)
+                    .values_list('product_id', 'quantity'))
+        expires_at = reservation_expiry()
+        StockReservation.objects.bulk_create(
+            [StockReservation(cart_key=new_key, product_id=pid, quantity=qty + held.get(pid, 0),
+                              expires_at=expires_at) for pid, qty in moving.items()],
+            update_conflicts=True, unique_fields=['cart_key', 'product'], update_fields=['quantity', 'expires_at'],
+        )
+
+
+def release_expired(now=None, batch_size=500):
+    """Give back every expired reservation, in batches. Returns how many were released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(StockReservation.objects.select_for_update(skip_locked=True)
+                        .filter(expires_at__lte=now).order_by('expires_at')
+                        .values_list('pk', 'product_id', 'quantity')[:batch_size])
+            if not rows:
+                break
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+            units = {}
+            for _, pid, qty in rows:
+                units[pid] = units.get(pid, 0) + qty
+            give_back(units)
+        released += len(rows)
+    return released
@@ -0,0 +1,285 @@
+"""
+A small database-backed job queue for work that shouldn't hold up a request.
+
+Functions decorated with @task are queued by dotted path with JSON keyword
+arguments::
+
+    jobs.enqueue_on_commit(tasks.send_order_confirmation, order_id=order.pk,
+                           dedupe_key=f'order-confirmation:{order.pk}')
+
+and run by ``manage.py run_workers``, a pool of worker processes. Each
+worker claims a batch of due jobs with one UPDATE, runs them and marks
+them done. A failed job is retried after an exponential backoff
+(STORE_JOB_BACKOFF_SECONDS doubled per attempt) until max_attempts, then
+kept as failed with its traceback. A job whose worker died is queued again
+after STORE_JOB_TIMEOUT.
+
+A ``dedupe_key`` allows one queued or running job per key; enqueueing
+another is a no-op. Tasks declared ``atomic`` run in the transaction that
+marks their job done, so their database writes happen exactly once even if
+the job is retried. Other tasks (e.g. sending mail) may run again after a
+crash and should tolerate it.
+
+With STORE_JOBS_EAGER the task runs right away in the calling process
+instead, which suits development without a worker.
+"""
+import logging
+import os
+import random
+import traceback
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF_SECONDS = 10
+MAX_BACKOFF_SECONDS = 60 * 60
+DEFAULT_TIMEOUT = 10 * 60
+DEFAULT_RETENTION = 24 * 60 * 60
+ERROR_LENGTH = 5000
+
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, atomic=False, max_attempts=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.atomic = atomic
+        self.max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+
+def task(func=None, *, atomic=False, max_attempts=None):
+    """Register ``func`` as a job; ``@task`` or ``@task(atomic=True, max_attempts=3)``."""
+    if func is None:
+        return partial(task, atomic=atomic, max_attempts=max_attempts)
+    registered = TASKS[f'{func.__module__}.{func.__qualname__}'] = Task(func, atomic, max_attempts)
+    return registered
+
+
+def get_task(name):
+    if name not in TASKS:
+        # Importing the module registers its tasks.
+        import_string(name)
+    return TASKS[name]
+
+
+def eager():
+    return getattr(settings, 'STORE_JOBS_EAGER', False)
+
+
+def enqueue(task, dedupe_key=None, delay=None, **kwargs):
+    """Queue ``task`` (a @task function) to run with ``kwargs``."""
+    if eager():
+        execute(task, kwargs)
+        return
+    run_at = timezone.now() + timedelta(seconds=delay) if delay else timezone.now()
+    # A pending job with the same dedupe_key trips the partial unique index.
+    Job.objects.bulk_create([Job(
+        name=task.name, payload=kwargs, dedupe_key=dedupe_key, max_attempts=task.max_attempts, run_at=run_at,
+    )], ignore_conflicts=True)
+
+
+def enqueue_on_commit(task, dedupe_key=None, delay=None, using=None, **kwargs):
+    """
+    enqueue() once the current transaction commits, so the job never sees
+    uncommitted rows and a rolled back request queues nothing. A failure
+    here is logged rather than raised: the request's work is already saved.
+    """
+    transaction.on_commit(partial(enqueue, task, dedupe_key=dedupe_key, delay=delay, **kwargs),
+                          using=using, robust=True)
+
+
+def execute(task, payload):
+    if task.atomic:
+        with transaction.atomic():
+            task(**payload)
+    else:
+        task(**payload)
+
+
+# Workers.
+
+def backoff(attempts):
+    base = getattr(settings, 'STORE_JOB_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS)
+    # Jitter spreads out jobs that failed together.
+    return min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS) * random.uniform(0.8, 1.2)
+
+
+def claim(limit=10):
+    """Mark up to ``limit`` due jobs as running for this caller and return them."""
+    token = f'{os.getpid()}-{uuid.uuid4().hex[:16]}'
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(Job.objects.select_for_update(skip_locked=True)
+                   .filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+                   .values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        # The status check keeps a job from going to two workers where the
+        # database has no row locks to skip.
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING, claimed_by=token, started_at=now, attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(claimed_by=token, status=Job.RUNNING).order_by('run_at', 'id'))
+
+
+def _finish(job):
+    # Only the claim that is still current may finish the job.
+    return Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by, status=Job.RUNNING).update(
+        status=Job.DONE, finished_at=timezone.now(), last_error='',
+    )
+
+
+class Superseded(Exception):
+    pass
+
+
+def run(job):
+    """Run one claimed job; returns its new status."""
+    try:
+        task = get_task(job.name)
+    except (ImportError, KeyError):
+        return _fail(job, f'Unknown task {job.name!r}.', retry=False)
+    try:
+        if task.atomic:
+            with transaction.atomic():
+                task(**job.payload)
+                if not _finish(job):
+                    raise Superseded
+        else:
+            task(**job.payload)
+            _finish(job)
+    except Superseded:
+        logger.warning('Job %s was reclaimed while running; its changes were rolled back', job.pk)
+        return Job.QUEUED
+    except Exception:
+        logger.warning('Job %s (%s) failed on attempt %d', job.pk, job.name, job.attempts, exc_info=True)
+        return _fail(job, traceback.format_exc())
+    return Job.DONE
+
+
+def _fail(job, error, retry=True):
+    if retry and job.attempts < job.max_attempts:
+        status, run_at = Job.QUEUED, timezone.now() + timedelta(seconds=backoff(job.attempts))
+    else:
+        status, run_at = Job.FAILED, job.run_at
+    Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by, status=Job.RUNNING).update(
+        status=status, run_at=run_at, finished_at=timezone.now() if status == Job.FAILED else None,
+        last_error=error[-ERROR_LENGTH:],
+    )
+    return status
+
+
+def work(stop, batch_size=10, poll=1.0, once=False):
+    """A worker's loop: claim, run, sleep when idle, until ``stop`` is set."""
+    processed = 0
+    while not stop.is_set():
+        try:
+            jobs = claim(batch_size)
+            for job in jobs:
+                run(job)
+                processed += 1
+        except Exception:
+            # E.g. the database is unreachable; the claimed jobs time out.
+            logger.exception('Worker %s could not claim or update jobs', os.getpid())
+            jobs = []
+        finally:
+            close_old_connections()
+        if not jobs:
+            if once:
+                return processed
+            stop.wait(poll)
+    return processed
+
+
+def requeue_stale(now=None):
+    """Queue again the running jobs whose worker went silent; returns how many."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'STORE_JOB_TIMEOUT', DEFAULT_TIMEOUT))
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, last_error='Timed out.',
+    )
+    return failed + stale.update(status=Job.QUEUED, run_at=now, claimed_by='', last_error='Timed out.')
+
+
+def purge(now=None, batch_size=5000):
+    """Delete done jobs older than STORE_JOB_RETENTION; returns how many."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'STORE_JOB_RETENTION', DEFAULT_RETENTION))
+    deleted = 0
+    while True:
+        ids = list(Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(id__in=ids).delete()[0]
+
+
+# Monitoring.
+
+def stats(now=None, window=300):
+    """
+    Queue depth and latency in one query: jobs ``ready`` to run now,
+    ``scheduled`` for later (retries), ``running`` and ``failed``; how long
+    the oldest ready job has waited; and, over jobs started in the last
+    ``window`` seconds, the mean and worst wait between due and started.
+    """
+    now = now or timezone.now()
+    ready = Q(status=Job.QUEUED, run_at__lte=now)
+    # A queued retry's run_at has moved past its last start.
+    recent = Q(started_at__gte=now - timedelta(seconds=window)) & ~Q(status=Job.QUEUED)
+    row = Job.objects.aggregate(
+        ready=Count('id', filter=ready),
+        scheduled=Count('id', filter=Q(status=Job.QUEUED, run_at__gt=now)),
+        running=Count('id', filter=Q(status=Job.RUNNING)),
+        failed=Count('id', filter=Q(status=Job.FAILED)),
+        oldest=Min('run_at', filter=ready),
+        started=Count('id', filter=recent),
+        wait_max=Max(F('started_at') - F('run_at'), filter=recent),
+        wait_total=Sum(F('started_at') - F('run_at'), filter=recent),
+    )
+    started = row.pop('started')
+    wait_total = row.pop('wait_total')
+    oldest = row.pop('oldest')
+    wait_max = row.pop('wait_max')
+    return {
+        **row,
+        'oldest_ready_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+        'recent_started': started,
+        'recent_wait_mean_seconds': wait_total.total_seconds() / started if started else 0.0,
+        'recent_wait_max_seconds': wait_max.total_seconds() if wait_max else 0.0,
+    }
+
+
+METRICS = [
+    ('ready', 'store_jobs_ready', 'Jobs due and waiting for a worker.'),
+    ('scheduled', 'store_jobs_scheduled', 'Jobs waiting for their retry time.'),
+    ('running', 'store_jobs_running', 'Jobs claimed by a worker.'),
+    ('failed', 'store_jobs_failed', 'Jobs that used up their attempts.'),
+    ('oldest_ready_seconds', 'store_jobs_oldest_ready_seconds', 'How long the oldest ready job has waited.'),
+    ('recent_wait_mean_seconds', 'store_jobs_wait_mean_seconds', 'Mean wait from due to started, last 5 minutes.'),
+    ('recent_wait_max_seconds', 'store_jobs_wait_max_seconds', 'Longest wait from due to started, last 5 minutes.'),
+]
+
+
+def metric_lines():
+    """Gauges for /metrics (see store.instrumentation)."""
+    values = stats()
+    lines = []
+    for key, name, documentation in METRICS:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} gauge', f'{name} {values[key]}']
+    return lines
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored total and item_count of orders from their lines, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--all', action='store_true',
+                            help='Refresh every order, not just ones whose stored totals are missing.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        orders = Order.objects.all() if options['all'] else Order.objects.needing_totals()
+        ids = orders.order_by('pk').values_list('pk', flat=True)
+        started = time.monotonic()
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            updated += Order.objects.filter(pk__in=batch).refresh_totals()
+            last_id = batch[-1]
+            self.stdout.write(f'  {updated} orders updated')
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed totals for {updated} orders in {time.monotonic() - started:.2f}s.'
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the "frequently bought together" table from every order: co-purchase counts via a '
+        'SciPy sparse matrix when available (pure Python otherwise), streamed in chunks of orders.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help='Neighbours kept per product (default: STORE_RECOMMENDATION_TOP_K).')
+        parser.add_argument('--engine', choices=recommendations.ENGINES, default='auto')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Orders counted per chunk.')
+        parser.add_argument('--min-count', type=int, default=1, help='Ignore pairs bought together fewer times.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            engine, products, rows = recommendations.build(
+                k=options['top_k'], engine=options['engine'],
+                chunk_size=options['chunk_size'], min_count=options['min_count'],
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+        if options['engine'] != 'auto':
+            reason = 'requested'
+        elif engine == 'sparse':
+            reason = 'numpy and scipy are installed'
+        else:
+            reason = 'numpy and scipy are not installed'
+            self.stderr.write(self.style.WARNING(
+                'Counted pairs in pure Python, whose memory grows with the number of product pairs. '
+                'Install numpy and scipy (see requirements.txt) for the sparse engine.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {rows} recommendations for {products} products ({engine} engine, {reason}) '
+            f'in {time.monotonic() - started:.2f}s.'
+        ))
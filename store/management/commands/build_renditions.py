@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from store import catalog_cache
+from store.models import Category, Product
+from store.renditions import render_variants, save_metadata
+
+MODELS = {'product': Product, 'category': Category}
+
+
+def _init_worker():
+    # Needed under the spawn start method; a no-op for forked workers.
+    django.setup()
+
+
+def _render(model_name, pk, image_name):
+    try:
+        return model_name, pk, render_variants(image_name), None
+    except (OSError, ValueError) as e:
+        return model_name, pk, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG renditions for product and category images using a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), action='append',
+                            help='Limit to one model (repeatable). Defaults to all.')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count).')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if renditions are current.')
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model_name in options['model'] or sorted(MODELS):
+            rows = MODELS[model_name].objects.exclude(image='').exclude(image__isnull=True)
+            for pk, name, metadata in rows.values_list('pk', 'image', 'image_renditions').iterator():
+                if options['force'] or (metadata or {}).get('source') != name:
+                    jobs.append((model_name, pk, name))
+        if not jobs:
+            self.stdout.write('All renditions are up to date.')
+            return
+
+        started = time.monotonic()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_render, *job) for job in jobs]
+            for future in as_completed(futures):
+                model_name, pk, metadata, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{model_name} {pk}: {error}')
+                    continue
+                # Results are written from the parent so workers never share DB connections.
+                save_metadata(MODELS[model_name], pk, metadata)
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f'  {done}/{len(jobs)}')
+        if done:
+            catalog_cache.bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Built renditions for {done} images ({failed} failed) in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.models import CartLine, StoredCart
+
+
+class Command(BaseCommand):
+    help = 'Delete database-stored carts that have not changed in the given number of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        stale = StoredCart.objects.filter(updated_at__lt=cutoff)
+        lines, _ = CartLine.objects.filter(cart__in=stale.values('key')).delete()
+        carts, _ = stale.delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {carts} carts ({lines} lines).'))
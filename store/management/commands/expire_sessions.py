@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions from the database in batches. Run it daily from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=sessions.DEFAULT_CLEAR_BATCH)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deleted = sessions.SessionStore.clear_expired(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions in {elapsed:.1f}s.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store import feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the sitemap index, chunked product sitemaps and the CSV/XML shopping feeds (gzipped) '
+        'to STORE_FEED_ROOT, rewriting only the chunks whose products changed since the last run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=getattr(settings, 'STORE_SITE_URL', None),
+                            help='Absolute site URL the links point at; defaults to STORE_SITE_URL.')
+        parser.add_argument('--full', action='store_true', help='Rewrite every chunk.')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        if not base_url or '://' not in base_url:
+            raise CommandError('Give an absolute --base-url (or set STORE_SITE_URL).')
+        started = time.monotonic()
+        rewritten, unchanged, removed = feeds.generate(base_url, full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(rewritten)} chunks ({len(unchanged)} unchanged, {len(removed)} removed) '
+            f'to {feeds.feed_root()} in {time.monotonic() - started:.2f}s.'
+        ))
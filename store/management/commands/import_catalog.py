@@ -0,0 +1,207 @@
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from store import catalog_cache, search
+from store.models import Category, Product
+
+PRODUCT_UPDATE_FIELDS = ['category', 'title', 'description', 'price', 'in_stock', 'updated_at']
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+_price_field = Product._meta.get_field('price')
+# The first price with more integer digits than the column holds.
+MAX_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(fh, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+    else:
+        for line in fh:
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    # Raised by parse_row, so the line is skipped like any bad row.
+                    row = e
+                yield row
+
+
+def parse_row(row):
+    if isinstance(row, ValueError):
+        raise ValueError(f'bad JSON: {row}')
+    title = (row.get('title') or '').strip()
+    slug = (row.get('slug') or '').strip() or slugify(title)
+    category_slug = (row.get('category_slug') or row.get('category') or '').strip()
+    if not title or not slug or not category_slug:
+        raise ValueError('title, slug and category_slug are required')
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise ValueError(f'bad price {row.get("price")!r}')
+    if not price.is_finite() or not 0 <= price < MAX_PRICE:
+        raise ValueError(f'bad price {row.get("price")!r}')
+    in_stock = row.get('in_stock', True)
+    if isinstance(in_stock, str):
+        in_stock = in_stock.strip().lower() in TRUE_VALUES
+    stock_quantity = row.get('stock_quantity')
+    if stock_quantity in (None, ''):
+        stock_quantity = None
+    else:
+        stock_quantity = int(stock_quantity)
+        if stock_quantity < 0:
+            raise ValueError(f'bad stock_quantity {stock_quantity!r}')
+        in_stock = stock_quantity > 0
+    return {
+        'category_slug': category_slug,
+        'category_name': (row.get('category_name') or '').strip() or category_slug.replace('-', ' ').title(),
+        'title': title[:200],
+        'slug': slug[:220],
+        'description': row.get('description') or '',
+        'price': price,
+        'in_stock': bool(in_stock),
+        'stock_quantity': stock_quantity,
+        # None when the feed has no image column: the stored image is kept.
+        'image': (row.get('image') or '').strip() if 'image' in row else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a CSV or JSONL catalog feed (optionally .gz) and upsert categories and '
+        'products by slug in batches. Columns: category_slug, category_name, title, slug, '
+        'description, price, in_stock, stock_quantity, image.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--checkpoint', help='JSON file recording progress; an existing one resumes the import.')
+        parser.add_argument('--strict', action='store_true', help='Abort on the first invalid row instead of skipping it.')
+        parser.add_argument('--no-reindex', action='store_true', help='Skip the search index rebuild at the end.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        fmt = options['format'] or ('jsonl' if '.jsonl' in path or '.ndjson' in path else 'csv')
+        checkpoint = self.load_checkpoint(options['checkpoint'], path)
+        skip = checkpoint['rows']
+        if skip:
+            self.stdout.write(f'Resuming after row {skip}.')
+
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        seen = imported = skipped = 0
+        batch = []
+        with open_text(path) as fh:
+            for line_no, row in enumerate(read_rows(fh, fmt), start=1):
+                seen = line_no
+                if line_no <= skip:
+                    continue
+                try:
+                    batch.append(parse_row(row))
+                except (ValueError, TypeError, AttributeError) as e:
+                    if options['strict']:
+                        raise CommandError(f'Row {line_no}: {e}')
+                    skipped += 1
+                    if skipped <= 20:
+                        self.stderr.write(f'Row {line_no} skipped: {e}')
+                if len(batch) >= batch_size:
+                    imported += self.flush(batch)
+                    batch = []
+                    self.save_checkpoint(options['checkpoint'], checkpoint, line_no)
+                    self.report(imported, skipped, started)
+            if batch:
+                imported += self.flush(batch)
+            self.save_checkpoint(options['checkpoint'], checkpoint, seen, done=True)
+
+        if imported:
+            # bulk_create skips the save signals, so refresh derived state once.
+            catalog_cache.bump_version()
+            if not options['no_reindex']:
+                search.rebuild_index()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products ({skipped} skipped) in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/s).'
+        ))
+
+    def flush(self, rows):
+        # Later rows win when a slug repeats inside one batch.
+        rows = list({row['slug']: row for row in rows}.values())
+        # Rows without an image column or a stock count leave the stored
+        # values alone, so they are upserted apart from the rows that set them.
+        groups = {}
+        for row in rows:
+            groups.setdefault((row['image'] is not None, row['stock_quantity'] is not None), []).append(row)
+        with transaction.atomic():
+            new_categories = {}
+            for row in rows:
+                if row['category_slug'] not in self.categories:
+                    new_categories.setdefault(row['category_slug'], row['category_name'])
+            if new_categories:
+                Category.objects.bulk_create(
+                    [Category(slug=slug, name=name) for slug, name in new_categories.items()],
+                    update_conflicts=True, unique_fields=['slug'], update_fields=['name'],
+                )
+                self.categories.update(
+                    Category.objects.filter(slug__in=new_categories).values_list('slug', 'id')
+                )
+            for (has_image, has_stock), group in groups.items():
+                update_fields = [*PRODUCT_UPDATE_FIELDS, *(['image'] if has_image else []),
+                                 *(['stock_quantity'] if has_stock else [])]
+                Product.objects.bulk_create(
+                    [
+                        Product(
+                            category_id=self.categories[row['category_slug']],
+                            title=row['title'], slug=row['slug'], description=row['description'],
+                            price=row['price'], in_stock=row['in_stock'], stock_quantity=row['stock_quantity'],
+                            image=row['image'] or None,
+                        )
+                        for row in group
+                    ],
+                    update_conflicts=True, unique_fields=['slug'], update_fields=update_fields,
+                )
+        return len(rows)
+
+    def report(self, imported, skipped, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'  {imported} imported, {skipped} skipped, {imported / elapsed if elapsed else 0:.0f} rows/s')
+
+    def load_checkpoint(self, checkpoint_path, path):
+        fresh = {'path': os.path.abspath(path), 'size': os.path.getsize(path), 'rows': 0, 'done': False}
+        if not checkpoint_path or not os.path.exists(checkpoint_path):
+            return fresh
+        with open(checkpoint_path) as fh:
+            saved = json.load(fh)
+        if saved.get('path') != fresh['path'] or saved.get('size') != fresh['size']:
+            raise CommandError(f'{checkpoint_path} belongs to a different feed; delete it to start over.')
+        if saved.get('done'):
+            raise CommandError(f'{checkpoint_path} records a finished import; delete it to import again.')
+        return saved
+
+    def save_checkpoint(self, checkpoint_path, checkpoint, rows, done=False):
+        if not checkpoint_path:
+            return
+        checkpoint.update(rows=rows, done=done)
+        tmp = f'{checkpoint_path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(checkpoint, fh)
+        os.replace(tmp, checkpoint_path)
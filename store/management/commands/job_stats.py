@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from store import jobs
+from store.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Show the job queue depth, how long jobs wait for a worker, and jobs per task and status.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=300, help='Seconds of started jobs the wait times cover.')
+        parser.add_argument('--watch', type=float, metavar='SECONDS', help='Print again every SECONDS.')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = jobs.stats(window=options['window'])
+            self.stdout.write(
+                f'ready {stats["ready"]}, scheduled {stats["scheduled"]}, running {stats["running"]}, '
+                f'failed {stats["failed"]}; oldest ready job waited {stats["oldest_ready_seconds"]:.1f}s'
+            )
+            self.stdout.write(
+                f'last {options["window"]}s: {stats["recent_started"]} started, waited '
+                f'{stats["recent_wait_mean_seconds"]:.2f}s on average, {stats["recent_wait_max_seconds"]:.2f}s at most'
+            )
+            if options['verbosity'] > 1:
+                rows = Job.objects.values('name', 'status').annotate(n=Count('id')).order_by('name', 'status')
+                for row in rows:
+                    self.stdout.write(f'  {row["name"]:<50} {row["status"]:<8} {row["n"]}')
+            if not options['watch']:
+                return
+            time.sleep(options['watch'])
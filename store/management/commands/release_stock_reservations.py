@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import inventory
+
+
+class Command(BaseCommand):
+    help = 'Give expired cart reservations back to stock. Run it every minute or so from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Keep running, sweeping every SECONDS, instead of exiting.')
+
+    def handle(self, *args, **options):
+        while True:
+            released = inventory.release_expired(batch_size=options['batch_size'])
+            if released or options['verbosity'] > 1:
+                self.stdout.write(f'Released {released} expired reservations.')
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import signal
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+HOUSEKEEPING_SECONDS = 60
+
+
+def worker(stop, batch_size, poll, once):
+    # Ctrl-C reaches the whole process group; let the supervisor decide.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    # A spawned worker starts from a fresh interpreter (DJANGO_SETTINGS_MODULE
+    # is inherited), so this module can't import models at the top.
+    django.setup()
+    from store import jobs
+    jobs.work(stop, batch_size=batch_size, poll=poll, once=once)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs (store.jobs) in a pool of worker processes until stopped with '
+        'Ctrl-C or SIGTERM. Also re-queues jobs of dead workers and purges old finished jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--batch-size', type=int, default=5, help='Jobs a worker claims at a time.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds an idle worker waits before looking again.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        # Spawned rather than forked: fork doesn't exist on Windows, and on
+        # macOS would copy a process that may already run threads (session
+        # flushes, typeahead rebuilds).
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        stopping = False
+
+        def request_stop(signum, frame):
+            nonlocal stopping
+            if stopping:
+                # Asked twice: don't wait for the jobs in progress.
+                for process in pool:
+                    if process is not None:
+                        process.terminate()
+            stopping = True
+            stop.set()
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        def spawn():
+            process = context.Process(
+                target=worker, args=(stop, options['batch_size'], options['poll'], options['once']), daemon=True,
+            )
+            process.start()
+            return process
+
+        started = time.monotonic()
+        self.housekeeping()
+        pool = []
+        pool += [spawn() for _ in range(options['processes'])]
+        self.stdout.write(f'Started {len(pool)} workers.')
+        last_housekeeping = time.monotonic()
+        while pool:
+            for i, process in enumerate(pool):
+                process.join(timeout=0.5 / len(pool))
+                if process.is_alive():
+                    continue
+                if stopping or options['once']:
+                    pool[i] = None
+                else:
+                    self.stderr.write(f'Worker {process.pid} exited with {process.exitcode}; restarting it.')
+                    pool[i] = spawn()
+            pool = [process for process in pool if process is not None]
+            if not stopping and time.monotonic() - last_housekeeping >= HOUSEKEEPING_SECONDS:
+                self.housekeeping()
+                last_housekeeping = time.monotonic()
+        self.stdout.write(self.style.SUCCESS(f'Workers stopped after {time.monotonic() - started:.1f}s.'))
+
+    def housekeeping(self):
+        from store import jobs
+        try:
+            requeued, purged = jobs.requeue_stale(), jobs.purge()
+        finally:
+            close_old_connections()
+        if requeued or purged:
+            self.stdout.write(f'Re-queued {requeued} stalled jobs, purged {purged} finished ones.')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import identifiers
+
+
+class Command(BaseCommand):
+    help = (
+        'Bring every user\'s login identifiers (username, email, phone) up to date. Run after '
+        'loaddata or bulk changes to users (bulk_create/update() skip the save signals).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checked = identifiers.rebuild(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Synced login identifiers for {checked} users in {elapsed:.1f}s.'))
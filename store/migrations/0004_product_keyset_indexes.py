@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_alter_category_options_category_image_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['in_stock', '-created_at', 'id'], name='store_prod_stock_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created_at', 'id'], name='store_prod_cat_created_idx'),
+        ),
+    ]
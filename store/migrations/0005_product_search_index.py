@@ -0,0 +1,38 @@
+from django.db import OperationalError, migrations
+
+
+FTS_TABLE = 'store_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, description, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        # No FTS5 in this SQLite build; store.search falls back to LIKE.
+        return
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+        f'SELECT id, title, description FROM store_product'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:39
+
+import store.models
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    lines = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        total=Coalesce(
+            models.Subquery(lines.annotate(s=models.Sum(models.F('price') * models.F('quantity'))).values('s')),
+            models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        item_count=Coalesce(models.Subquery(lines.annotate(s=models.Sum('quantity')).values('s')), models.Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='currency',
+            field=models.CharField(default=store.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
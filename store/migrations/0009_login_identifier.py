@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:42
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Copied from store.identifiers as of this migration, so later changes to
+# the live helpers don't change what the backfill does.
+EMAIL = 'email'
+PHONE = 'phone'
+USERNAME = 'username'
+
+_PHONE_CHARS_RE = re.compile(r'^[\d\s()+.\-]+$')
+
+
+def normalize_email(value):
+    value = (value or '').strip()
+    if '@' not in value:
+        return ''
+    return value.lower()
+
+
+def normalize_phone(value):
+    value = (value or '').strip()
+    if not value or not _PHONE_CHARS_RE.match(value):
+        return ''
+    digits = re.sub(r'\D', '', value)
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = getattr(settings, 'STORE_DEFAULT_PHONE_COUNTRY_CODE', '1') + digits.lstrip('0')
+    if not 8 <= len(digits) <= 15:
+        return ''
+    return '+' + digits
+
+
+def make_key(kind, value):
+    return f'{kind}:{value}'
+
+
+def backfill_identifiers(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('store', 'UserProfile')
+    LoginIdentifier = apps.get_model('store', 'LoginIdentifier')
+    phones = dict(UserProfile.objects.values_list('user_id', 'phone'))
+    rows, seen = [], set()
+    # Oldest account first, so it keeps any email/phone shared with later ones.
+    for user_id, username, email in User.objects.order_by('pk').values_list('pk', 'username', 'email').iterator():
+        candidates = [(USERNAME, make_key(USERNAME, username))]
+        if normalize_email(email):
+            candidates.append((EMAIL, make_key(EMAIL, normalize_email(email))))
+        if normalize_phone(phones.get(user_id)):
+            candidates.append((PHONE, make_key(PHONE, normalize_phone(phones[user_id]))))
+        for kind, key in candidates:
+            if key not in seen:
+                seen.add(key)
+                rows.append(LoginIdentifier(key=key, kind=kind, user_id=user_id))
+        if len(rows) >= 5000:
+            LoginIdentifier.objects.bulk_create(rows)
+            rows = []
+    LoginIdentifier.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_stored_cart'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginIdentifier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=270, unique=True)),
+                ('kind', models.CharField(choices=[('email', 'Email'), ('phone', 'Phone'), ('username', 'Username')], max_length=10)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='login_identifiers', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_identifiers, migrations.RunPython.noop),
+    ]
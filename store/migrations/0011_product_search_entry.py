@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+import django.db.models.deletion
+import store.models
+from django.db import migrations, models
+
+FTS_TABLE = 'store_product_fts'
+
+
+def set_rank_weights(apps, schema_editor):
+    # Make the FTS5 "rank" column the title-weighted bm25 store.search orders by.
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='store.product')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('document', store.models.FullTextField(db_column='store_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'store_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(set_rank_weights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='store.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_by', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-count'], name='store_recommendation_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'recommended'), name='store_recommendation_unique')],
+            },
+        ),
+    ]
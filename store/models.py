@@ -1,6 +1,16 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+
+def default_currency():
+    return getattr(settings, 'STORE_CURRENCY', 'USD')
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=20, blank=True)
@@ -13,6 +23,8 @@ class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     image = models.ImageField(upload_to='categories/', null=True, blank=True)  # Add this line
+    # Resized variants of image and their dimensions; see store.renditions.
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -25,12 +37,88 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     in_stock = models.BooleanField(default=True)
+    # Units on hand. None means stock isn't tracked and in_stock is set by
+    # hand; otherwise in_stock follows it (see store.inventory).
+    stock_quantity = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped by the bulk updates (stock, admin actions), so the sitemap
+    # and feed export can tell which chunks changed (see store.feeds).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at DESC, id) within these filters.
+            models.Index(fields=['in_stock', '-created_at', 'id'], name='store_prod_stock_created_idx'),
+            models.Index(fields=['category', '-created_at', 'id'], name='store_prod_cat_created_idx'),
+            # Faceted listing: price sorts and ranges, and in-stock within a category.
+            models.Index(fields=['price', 'id'], name='store_prod_price_idx'),
+            models.Index(fields=['in_stock', 'price', 'id'], name='store_prod_stock_price_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='store_prod_cat_price_idx'),
+            models.Index(fields=['category', 'in_stock', '-created_at', 'id'], name='store_prod_cat_stock_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self.stock_quantity is not None:
+            self.in_stock = self.stock_quantity > 0
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'stock_quantity' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'in_stock'}
+        super().save(*args, **kwargs)
+
+
+class StockReservation(models.Model):
+    # Units taken off a product's stock_quantity while they sit in a cart;
+    # given back at checkout or by release_stock_reservations once expired.
+    cart_key = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='store_reservation_unique_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} × {self.product_id} for {self.cart_key}'
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_live_totals(self):
+        # Totals computed in SQL from the order lines, for rows written before
+        # the stored columns existed or by code that bypassed them.
+        lines = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+        return self.annotate(
+            live_total=Coalesce(
+                models.Subquery(lines.annotate(s=models.Sum(models.F('price') * models.F('quantity'))).values('s')),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            live_item_count=Coalesce(
+                models.Subquery(lines.annotate(s=models.Sum('quantity')).values('s')), Value(0),
+            ),
+        )
+
+    def needing_totals(self):
+        return self.filter(item_count=0, items__isnull=False).distinct()
+
+    def refresh_totals(self):
+        # One UPDATE for the whole queryset.
+        lines = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+        return self.order_by().update(
+            total=Coalesce(
+                models.Subquery(lines.annotate(s=models.Sum(models.F('price') * models.F('quantity'))).values('s')),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            item_count=Coalesce(models.Subquery(lines.annotate(s=models.Sum('quantity')).values('s')), Value(0)),
+        )
+
 
 class Order(models.Model):
     full_name = models.CharField(max_length=200)
@@ -40,13 +128,27 @@ class Order(models.Model):
     postal_code = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
     paid = models.BooleanField(default=False)
+    # Rendered into the checkout form so a double submit maps to one order.
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # Denormalized from the order lines whenever the order is written.
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    item_count = models.PositiveIntegerField(default=0)
+    currency = models.CharField(max_length=3, default=default_currency)
+
+    objects = OrderQuerySet.as_manager()
 
     def __str__(self):
         return f"Order #{self.id} - {self.full_name}"
 
-    @property
-    def total(self):
-        return sum(item.subtotal for item in self.items.all())
+    def recalculate_totals(self, save=True):
+        totals = self.items.aggregate(
+            total=models.Sum(models.F('price') * models.F('quantity')),
+            item_count=models.Sum('quantity'),
+        )
+        self.total = totals['total'] or Decimal('0.00')
+        self.item_count = totals['item_count'] or 0
+        if save:
+            self.save(update_fields=['total', 'item_count'])
 
 
 class OrderItem(models.Model):
@@ -58,3 +160,166 @@ class OrderItem(models.Model):
     @property
     def subtotal(self):
         return self.price * self.quantity
+
+
+class DailySales(models.Model):
+    # Per-day totals across all orders; maintained by store.rollups.
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+
+    @property
+    def average_order_value(self):
+        return (self.revenue / self.orders).quantize(Decimal('0.01')) if self.orders else Decimal('0.00')
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, related_name='daily_sales', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name_plural = 'daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='store_dailycategorysales_unique'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name_plural = 'daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='store_dailyproductsales_unique'),
+        ]
+
+
+class ProductRecommendation(models.Model):
+    # "Frequently bought together": the top co-purchased products per
+    # product with the number of orders containing both. Rebuilt by
+    # build_recommendations, topped up at checkout (see store.recommendations).
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+    recommended = models.ForeignKey(Product, related_name='recommended_by', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'recommended'], name='store_recommendation_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count'], name='store_recommendation_top_idx'),
+        ]
+
+
+class StoredCart(models.Model):
+    # Used by store.cart_storage.DatabaseCartStorage; the running totals let
+    # the cart badge be read without touching the lines.
+    key = models.CharField(max_length=64, primary_key=True)
+    item_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(StoredCart, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='store_cartline_unique_product'),
+        ]
+
+
+class LoginIdentifier(models.Model):
+    # Normalized "kind:value" keys (email, E.164 phone, username) for
+    # EmailOrPhoneBackend; kept in sync by store.signals.
+    KIND_CHOICES = [('email', 'Email'), ('phone', 'Phone'), ('username', 'Username')]
+
+    key = models.CharField(max_length=270, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, related_name='login_identifiers', on_delete=models.CASCADE)
+
+    def __str__(self):
+        return self.key
+
+
+class Job(models.Model):
+    # Background work queued by store.jobs and run by run_workers. At most
+    # one queued or running job per dedupe_key; run_at moves forward on each
+    # retry.
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='store_job_pending_dedupe'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='store_job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class FullTextField(models.TextField):
+    # Stands in for an FTS5 table's hidden column of the same name, which is
+    # what the MATCH operator is applied to.
+    pass
+
+
+@FullTextField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class ProductSearchEntry(models.Model):
+    # Read-only view of the SQLite FTS5 table managed by store.search, so the
+    # ORM can join products to it (rowid = product id) and order by rank.
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', related_name='search_entry',
+        on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    title = models.TextField()
+    description = models.TextField()
+    document = FullTextField(db_column='store_product_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'store_product_fts'
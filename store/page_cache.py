@@ -0,0 +1,151 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import catalog_cache
+from .cart import Cart
+
+# Rendered into the shared copy of a page in place of per-visitor values and
+# swapped for the real ones ("hole punching") each time the page is served.
+CSRF_PLACEHOLDER = 'store-page-cache-csrf-token'
+CART_BADGE_PLACEHOLDER = '<!--store-page-cache-cart-badge-->'
+DEFAULT_TIMEOUT = 10 * 60
+
+
+def is_placeholder_render(request):
+    return getattr(request, '_page_cache_render', False)
+
+
+def _cacheable_request(request):
+    if not getattr(settings, 'STORE_PAGE_CACHE', True):
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # A pending flash message makes this render one-off.
+    return CookieStorage.cookie_name not in request.COOKIES
+
+
+def _cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'store:page:{catalog_cache.get_version()}:{path}'
+
+
+def _entry_from(response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    content = response.content
+    return {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'digest': hashlib.md5(content).hexdigest(),
+    }
+
+
+def _fill(entry, request):
+    # The CSRF cookie must exist before the token is rendered, otherwise the
+    # form token and the cookie issued with this response won't match.
+    token = get_token(request)
+    badge = render_to_string('store/includes/cart_badge.html', {'cart_item_count': len(Cart(request))})
+    content = entry['content'].replace(CSRF_PLACEHOLDER.encode(), token.encode())
+    return content.replace(CART_BADGE_PLACEHOLDER.encode(), badge.encode())
+
+
+def _etag(entry, request):
+    # The form token is only reusable while the visitor's CSRF cookie is
+    # unchanged, and the badge depends on their cart, so both feed the tag.
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not csrf_cookie:
+        return None
+    count = len(Cart(request))
+    return '"%s"' % hashlib.md5(f'{entry["digest"]}:{csrf_cookie}:{count}'.encode()).hexdigest()
+
+
+def _lookup(request):
+    # Returns (response, pending): a finished response (a 304 or a filled
+    # cache hit), or the (key, last_modified) under which to store a render.
+    if not _cacheable_request(request):
+        return None, None
+    key = _cache_key(request)
+    last_modified = catalog_cache.get_last_modified()
+    entry = cache.get(key)
+    if entry is None:
+        return None, (key, last_modified)
+    etag = _etag(entry, request)
+    if etag:
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            not_modified['Cache-Control'] = 'private, no-cache'
+            return not_modified, None
+    return _respond(entry, request, etag, last_modified), None
+
+
+def _store(request, pending, response):
+    entry = _entry_from(response)
+    if entry is None:
+        return response
+    key, last_modified = pending
+    cache.set(key, entry, getattr(settings, 'STORE_PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    return _respond(entry, request, _etag(entry, request), last_modified)
+
+
+def _respond(entry, request, etag, last_modified):
+    response = HttpResponse(_fill(entry, request), content_type=entry['content_type'])
+    if etag:
+        response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cache_anonymous_page(view):
+    """
+    Serve ``view`` to logged-out visitors from a shared, catalog-versioned
+    copy of the rendered page, with the CSRF token and cart badge punched in
+    per request. Repeat requests carrying a matching ETag or
+    If-Modified-Since get a 304 without rendering anything. Works on both
+    sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response, pending = await sync_to_async(_lookup)(request)
+            if response is not None:
+                return response
+            if pending is None:
+                return await view(request, *args, **kwargs)
+            request._page_cache_render = True
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                request._page_cache_render = False
+            return await sync_to_async(_store)(request, pending, response)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response, pending = _lookup(request)
+        if response is not None:
+            return response
+        if pending is None:
+            return view(request, *args, **kwargs)
+        request._page_cache_render = True
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            request._page_cache_render = False
+        return _store(request, pending, response)
+
+    return wrapper
@@ -0,0 +1,287 @@
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+
+PAGE_PARAM = 'page'
+CURSOR_PARAM = 'cursor'
+COUNT_CACHE_TIMEOUT = 300
+
+
+def limited_page_range(current_page, total_pages):
+    # Limited page numbers for pagination controls
+    if total_pages <= 7:
+        return list(range(1, total_pages + 1))
+    if current_page <= 4:
+        return list(range(1, 6)) + ['...', total_pages]
+    if current_page > total_pages - 4:
+        return [1, '...'] + list(range(total_pages - 4, total_pages + 1))
+    return [1, '...'] + list(range(current_page - 1, current_page + 2)) + ['...', total_pages]
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which breaks seeking.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction, number):
+    payload = json.dumps({'v': values, 'd': direction, 'n': number}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data['d'] not in ('n', 'p') or not isinstance(data['v'], list):
+            return None
+        return data['v'], data['d'], max(int(data['n']), 1)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def count_cache_timeout():
+    return getattr(settings, 'STORE_PAGINATION_COUNT_TIMEOUT', COUNT_CACHE_TIMEOUT)
+
+
+def count_cache_key(queryset):
+    try:
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        # queryset.none(), e.g. a search with no usable terms.
+        return None
+    return 'store:pagecount:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+
+
+def cached_count(queryset):
+    """
+    ``queryset.count()``, remembered for STORE_PAGINATION_COUNT_TIMEOUT
+    seconds: page counts tolerate being briefly out of date, and an exact
+    COUNT over a large table is often the slowest query on the page.
+    """
+    key = count_cache_key(queryset)
+    if key is None:
+        return 0
+    total = cache.get(key)
+    if total is None:
+        total = queryset.order_by().count()
+        cache.set(key, total, count_cache_timeout())
+    return total
+
+
+class EstimatedCountPaginator(Paginator):
+    # A drop-in Paginator (e.g. for ModelAdmin.paginator) whose count comes
+    # from cached_count() instead of a COUNT on every page view.
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class KeysetPage:
+    def __init__(self, object_list, number, num_pages, has_next, has_previous,
+                 next_cursor=None, previous_cursor=None, base_query=''):
+        self.object_list = object_list
+        self.number = number
+        self.num_pages = num_pages
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.base_query = base_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f'<KeysetPage {self.number}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_query(self):
+        if self.next_cursor:
+            return f'{CURSOR_PARAM}={self.next_cursor}{self.base_query}'
+        return f'{PAGE_PARAM}={self.number + 1}{self.base_query}'
+
+    @property
+    def previous_query(self):
+        if self.previous_cursor:
+            return f'{CURSOR_PARAM}={self.previous_cursor}{self.base_query}'
+        return f'{PAGE_PARAM}={self.number - 1}{self.base_query}'
+
+    @property
+    def page_range(self):
+        if self.num_pages is None:
+            # Without a count only the pages around the current one are known.
+            pages = list(range(max(self.number - 1, 1), self.number + 1))
+            if self._has_next:
+                pages += [self.number + 1, '...']
+            return pages
+        return limited_page_range(self.number, self.num_pages)
+
+
+class KeysetPaginator:
+    """
+    Seek-based paginator over a stable ordering ending in a unique column.
+
+    Next/previous links carry an opaque cursor holding the boundary row's
+    ordering values, so a page costs one indexed range scan regardless of
+    depth. Numbered links (``?page=N``) still fall back to OFFSET for direct
+    jumps. The exact COUNT is replaced by a cached estimate, or skipped
+    entirely with ``estimate_count=False``.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', 'id'), estimate_count=True, keyset=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.estimate_count = estimate_count
+        if keyset is None:
+            keyset = getattr(settings, 'STORE_KEYSET_PAGINATION', True)
+        self.keyset = keyset
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _values_for(self, obj):
+        return [getattr(obj, name) for name, _ in self._fields()]
+
+    def _parse_values(self, values):
+        fields = self._fields()
+        if len(values) != len(fields):
+            return None
+        annotations = self.queryset.query.annotations
+        parsed = []
+        for (name, _), value in zip(fields, values):
+            field = annotations[name].output_field if name in annotations else self.queryset.model._meta.get_field(name)
+            try:
+                parsed.append(field.to_python(value))
+            except ValidationError:
+                return None
+        return parsed
+
+    def _seek(self, values, forward):
+        # Lexicographic "row comes after (or before) values" for mixed directions.
+        condition = Q()
+        fields = self._fields()
+        for i, (name, descending) in enumerate(fields):
+            lookup = f'{name}__lt' if descending == forward else f'{name}__gt'
+            clause = Q(**{lookup: values[i]})
+            for j in range(i):
+                clause &= Q(**{fields[j][0]: values[j]})
+            condition |= clause
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def count(self):
+        return cached_count(self.queryset) if self.estimate_count else None
+
+    async def acount(self):
+        if not self.estimate_count:
+            return None
+        key = count_cache_key(self.queryset)
+        if key is None:
+            return 0
+        total = await cache.aget(key)
+        if total is None:
+            total = await self.queryset.order_by().acount()
+            await cache.aset(key, total, count_cache_timeout())
+        return total
+
+    def _pages_for(self, total):
+        if total is None:
+            return None
+        return max((total + self.per_page - 1) // self.per_page, 1)
+
+    def num_pages(self):
+        return self._pages_for(self.count())
+
+    def _select(self, params, num_pages):
+        # Returns the (unevaluated) slice for the requested page, whether it
+        # was reached by a forward/backward cursor or an offset, and its number.
+        ordered = self.queryset.order_by(*self.ordering)
+        cursor = decode_cursor(params.get(CURSOR_PARAM) or '') if self.keyset else None
+        values = self._parse_values(cursor[0]) if cursor else None
+        if values is not None:
+            _, direction, number = cursor
+            if direction == 'n':
+                return ordered.filter(self._seek(values, forward=True))[:self.per_page + 1], 'n', number
+            rows = (self.queryset.filter(self._seek(values, forward=False))
+                    .order_by(*self._reversed_ordering())[:self.per_page + 1])
+            return rows, 'p', number
+        try:
+            number = max(int(params.get(PAGE_PARAM) or 1), 1)
+        except (TypeError, ValueError):
+            number = 1
+        if num_pages is not None:
+            number = min(number, num_pages)
+        offset = (number - 1) * self.per_page
+        return ordered[offset:offset + self.per_page + 1], 'o', number
+
+    def _build(self, params, rows, direction, number, num_pages):
+        base_query = urlencode([
+            (key, value) for key, value in params.lists() if key not in (PAGE_PARAM, CURSOR_PARAM)
+        ], doseq=True) if hasattr(params, 'lists') else ''
+        base_query = f'&{base_query}' if base_query else ''
+        if direction == 'p':
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            has_next = len(rows) > self.per_page
+            has_previous = True if direction == 'n' else number > 1
+            rows = rows[:self.per_page]
+        if direction != 'o' and (number == 1 or not has_previous):
+            number, has_previous = 1, False
+
+        if num_pages is not None and number >= num_pages and has_next:
+            # The estimate lagged behind; never hide a real next page.
+            num_pages = number + 1
+        next_cursor = previous_cursor = None
+        if self.keyset and rows:
+            if has_next:
+                next_cursor = encode_cursor(self._values_for(rows[-1]), 'n', number + 1)
+            if has_previous and number > 2:
+                previous_cursor = encode_cursor(self._values_for(rows[0]), 'p', number - 1)
+        return KeysetPage(rows, number, num_pages, has_next, has_previous,
+                          next_cursor=next_cursor, previous_cursor=previous_cursor, base_query=base_query)
+
+    def get_page(self, params):
+        num_pages = self.num_pages()
+        rows, direction, number = self._select(params, num_pages)
+        return self._build(params, list(rows), direction, number, num_pages)
+
+    async def aget_page(self, params):
+        num_pages = self._pages_for(await self.acount())
+        rows, direction, number = self._select(params, num_pages)
+        return self._build(params, [row async for row in rows], direction, number, num_pages)
@@ -0,0 +1,156 @@
+"""
+"Frequently bought together" recommendations.
+
+build() streams the order lines grouped by order and counts, for every pair
+of products, the orders that contain both: the co-purchase matrix. With
+NumPy/SciPy installed each chunk of orders becomes a sparse order × product
+matrix X and the counts accumulate as X.T @ X; without them a dict of
+Counters does the same. Only the order chunk and the (sparse) pair counts
+are held in memory. The top STORE_RECOMMENDATION_TOP_K products per product
+are then written to ProductRecommendation.
+
+Between builds, record_order() adds each new order's pairs onto the table.
+That is approximate: a pair that didn't make a product's top k starts
+again from 1, and the table grows past k rows per product until the next
+build trims it. for_product() reads the best ones with one indexed query.
+"""
+import heapq
+import itertools
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from . import rollups
+from .models import OrderItem, Product, ProductRecommendation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # in requirements.txt; without them build() falls back to pure Python
+    np = sparse = None
+
+DEFAULT_TOP_K = 10
+DEFAULT_LIMIT = 4
+# Bulk orders pair everything with everything and say little about what
+# goes together; they are left out.
+DEFAULT_MAX_BASKET = 50
+ENGINES = ('auto', 'sparse', 'python')
+
+
+def top_k():
+    return getattr(settings, 'STORE_RECOMMENDATION_TOP_K', DEFAULT_TOP_K)
+
+
+def max_basket():
+    return getattr(settings, 'STORE_RECOMMENDATION_MAX_BASKET', DEFAULT_MAX_BASKET)
+
+
+def for_product(product, limit=None):
+    limit = limit or getattr(settings, 'STORE_RECOMMENDATION_LIMIT', DEFAULT_LIMIT)
+    return (Product.objects.filter(recommended_by__product=product, in_stock=True)
+            .order_by('-recommended_by__count', 'id')[:limit])
+
+
+def record_order(product_ids):
+    basket = sorted(set(product_ids))
+    if not 2 <= len(basket) <= max_basket():
+        return
+    rollups.increment(ProductRecommendation, ('product_id', 'recommended_id'), [
+        {'product_id': a, 'recommended_id': b, 'count': 1} for a, b in itertools.permutations(basket, 2)
+    ], counters=('count',))
+
+
+def baskets(chunk_size=10000, last_order_id=None):
+    """Each order's distinct product ids, streamed in order id order."""
+    lines = OrderItem.objects.order_by('order_id').values_list('order_id', 'product_id')
+    if last_order_id is not None:
+        lines = lines.filter(order_id__lte=last_order_id)
+    lines = lines.iterator(chunk_size=chunk_size)
+    limit = max_basket()
+    for _, group in itertools.groupby(lines, key=itemgetter(0)):
+        basket = sorted({product_id for _, product_id in group})
+        if 2 <= len(basket) <= limit:
+            yield basket
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def count_pairs_sparse(baskets, size, chunk_size=10000):
+    counts = sparse.csr_matrix((size, size), dtype=np.int64)
+    for chunk in _chunks(baskets, chunk_size):
+        rows = np.repeat(np.arange(len(chunk)), [len(basket) for basket in chunk])
+        cols = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.int64, count=len(rows))
+        orders = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(len(chunk), size))
+        counts = counts + orders.T @ orders
+    # The diagonal is each product's own order count.
+    counts = (counts - sparse.diags(counts.diagonal(), dtype=counts.dtype)).tocsr()
+    counts.eliminate_zeros()
+    return counts
+
+
+def top_pairs_sparse(counts, k, min_count=1):
+    for product_id in range(counts.shape[0]):
+        start, end = counts.indptr[product_id], counts.indptr[product_id + 1]
+        if start == end:
+            continue
+        others, values = counts.indices[start:end], counts.data[start:end]
+        best = np.lexsort((others, -values))[:k]
+        yield product_id, [(int(others[i]), int(values[i])) for i in best if values[i] >= min_count]
+
+
+def count_pairs_python(baskets):
+    counts = defaultdict(Counter)
+    for basket in baskets:
+        for a, b in itertools.permutations(basket, 2):
+            counts[a][b] += 1
+    return counts
+
+
+def top_pairs_python(counts, k, min_count=1):
+    for product_id in sorted(counts):
+        best = heapq.nsmallest(k, counts[product_id].items(), key=lambda pair: (-pair[1], pair[0]))
+        yield product_id, [(other, n) for other, n in best if n >= min_count]
+
+
+def build(k=None, engine='auto', chunk_size=10000, min_count=1, batch_size=5000):
+    """
+    Recompute the co-purchase counts from every order and replace the
+    recommendation table with each product's top ``k``. Returns the engine
+    used and the number of products and rows written.
+    """
+    k = k or top_k()
+    if engine == 'auto':
+        engine = 'sparse' if sparse is not None else 'python'
+    if engine == 'sparse' and sparse is None:
+        raise ImportError('The sparse engine needs numpy and scipy.')
+
+    # Orders placed while this runs are counted by the next build.
+    snapshot = OrderItem.objects.aggregate(order=Max('order_id'), product=Max('product_id'))
+    lines = baskets(chunk_size, snapshot['order'] or 0)
+    if engine == 'sparse':
+        size = (snapshot['product'] or 0) + 1
+        top = top_pairs_sparse(count_pairs_sparse(lines, size, chunk_size), k, min_count)
+    else:
+        top = top_pairs_python(count_pairs_python(lines), k, min_count)
+
+    written = {'products': 0, 'rows': 0}
+
+    def rows():
+        for product_id, best in top:
+            written['products'] += bool(best)
+            for other, n in best:
+                yield ProductRecommendation(product_id=product_id, recommended_id=other, count=n)
+
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        for batch in _chunks(rows(), batch_size):
+            ProductRecommendation.objects.bulk_create(batch)
+            written['rows'] += len(batch)
+    return engine, written['products'], written['rows']
@@ -0,0 +1,100 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.functions import Now
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+DEFAULT_FORMATS = ('webp', 'jpeg')
+DEFAULT_QUALITY = 80
+RENDITIONS_DIR = 'renditions'
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def widths():
+    return tuple(getattr(settings, 'STORE_IMAGE_RENDITION_WIDTHS', DEFAULT_WIDTHS))
+
+
+def formats():
+    return tuple(getattr(settings, 'STORE_IMAGE_RENDITION_FORMATS', DEFAULT_FORMATS))
+
+
+def rendition_name(source_name, width, fmt):
+    stem = os.path.splitext(source_name)[0]
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{RENDITIONS_DIR}/{stem}-{width}w.{ext}'
+
+
+def flatten(image, background=(255, 255, 255)):
+    # JPEG has no alpha channel: composite transparent areas onto white, as
+    # convert('RGB') alone would turn them black.
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        flat = Image.new('RGB', image.size, background)
+        flat.paste(image, mask=image.getchannel('A'))
+        return flat
+    return image.convert('RGB')
+
+
+def render_variants(source_name, storage=None):
+    """
+    Write resized, recompressed copies of ``source_name`` at each configured
+    width (never upscaling) in each configured format, and return the
+    metadata stored on the model's ``image_renditions`` field. Only touches
+    storage, never the database, so it is safe to run in a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    quality = getattr(settings, 'STORE_IMAGE_RENDITION_QUALITY', DEFAULT_QUALITY)
+    with storage.open(source_name, 'rb') as fh:
+        image = ImageOps.exif_transpose(Image.open(fh))
+        image.load()
+    original_width, original_height = image.size
+    targets = sorted({w for w in widths() if w < original_width} | {min(original_width, max(widths()))})
+
+    variants = []
+    for width in targets:
+        height = max(round(original_height * width / original_width), 1)
+        resized = image.resize((width, height), Image.LANCZOS) if width != original_width else image
+        for fmt in formats():
+            frame = resized
+            if fmt == 'jpeg' and frame.mode not in ('RGB', 'L'):
+                frame = flatten(frame)
+            elif frame.mode not in ('RGB', 'RGBA', 'L'):
+                frame = frame.convert('RGBA')
+            buffer = io.BytesIO()
+            frame.save(buffer, format=fmt.upper(), quality=quality, optimize=True)
+            name = rendition_name(source_name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+            variants.append({'width': width, 'height': height, 'format': fmt, 'name': name})
+    return {'source': source_name, 'width': original_width, 'height': original_height, 'variants': variants}
+
+
+def needs_renditions(instance):
+    name = instance.image.name if instance.image else ''
+    return (instance.image_renditions or {}).get('source', '') != name
+
+
+def update_renditions(instance, storage=None):
+    # Written with update() so this doesn't re-fire the post_save that called it.
+    name = instance.image.name if instance.image else ''
+    metadata = render_variants(name, storage) if name else {}
+    save_metadata(type(instance), instance.pk, metadata)
+    instance.image_renditions = metadata
+    return metadata
+
+
+def save_metadata(model, pk, metadata):
+    # update() skips auto_now, so updated_at (which keys the cached product
+    # cards) is bumped by hand on models that have it.
+    values = {'image_renditions': metadata}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        values['updated_at'] = Now()
+    model.objects.filter(pk=pk).update(**values)
@@ -0,0 +1,137 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem
+
+COUNTERS = ('orders', 'units', 'revenue')
+
+
+def increment(model, key_fields, rows, using='default', counters=COUNTERS):
+    """
+    Add ``rows`` (dicts of key fields plus ``counters``) onto the existing
+    rollup rows, creating missing ones. One INSERT ... ON CONFLICT DO UPDATE
+    where the database supports it; an update-or-create per row elsewhere.
+    """
+    if not rows:
+        return
+    connection = connections[using]
+    if connection.vendor in ('sqlite', 'postgresql'):
+        opts = model._meta
+        qn = connection.ops.quote_name
+        columns = [opts.get_field(name).column for name in (*key_fields, *counters)]
+        keys = [opts.get_field(name).column for name in key_fields]
+        values = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+        params = [
+            opts.get_field(name).get_db_prep_save(row[name], connection)
+            for row in rows for name in (*key_fields, *counters)
+        ]
+        updates = ', '.join(f'{qn(c)} = {qn(opts.db_table)}.{qn(c)} + excluded.{qn(c)}' for c in counters)
+        sql = (
+            f'INSERT INTO {qn(opts.db_table)} ({", ".join(qn(c) for c in columns)}) VALUES {values} '
+            f'ON CONFLICT ({", ".join(qn(c) for c in keys)}) DO UPDATE SET {updates}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return
+    with transaction.atomic(using=using):
+        for row in rows:
+            key = {name: row[name] for name in key_fields}
+            updated = model.objects.using(using).filter(**key).update(
+                **{name: F(name) + row[name] for name in counters}
+            )
+            if not updated:
+                model.objects.using(using).create(**row)
+
+
+def record_order(order, lines):
+    """
+    Add one freshly placed order to the daily rollups. ``lines`` are its
+    ``(product, quantity, price)`` tuples; products need ``category_id``.
+    Runs in the order's record_order_stats job (see store.tasks), in the
+    transaction that marks the job done, so an order is counted once.
+    """
+    day = timezone.localdate(order.created_at)
+    by_product, by_category = {}, {}
+    for product, quantity, price in lines:
+        for rows, field, key in ((by_product, 'product_id', product.pk), (by_category, 'category_id', product.category_id)):
+            row = rows.setdefault(key, {'date': day, field: key, 'orders': 1, 'units': 0, 'revenue': Decimal('0.00')})
+            row['units'] += quantity
+            row['revenue'] += price * quantity
+    increment(DailyProductSales, ('date', 'product_id'), list(by_product.values()))
+    increment(DailyCategorySales, ('date', 'category_id'), list(by_category.values()))
+    increment(DailySales, ('date',), [{'date': day, 'orders': 1, 'units': order.item_count, 'revenue': order.total}])
+
+
+def _day_bounds(start, end):
+    # Local-midnight boundaries, so rebuilt days match record_order's dates.
+    tz = timezone.get_current_timezone()
+    begin = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min), tz)
+    finish = timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min), tz)
+    return begin, finish
+
+
+def rebuild(start, end, batch_size=5000):
+    """
+    Recompute every rollup row for the dates ``start``..``end`` (inclusive)
+    from the raw orders, replacing what was there. Returns the number of
+    (overall, category, product) rows written.
+    """
+    begin, finish = _day_bounds(start, end)
+    items = OrderItem.objects.filter(order__created_at__gte=begin, order__created_at__lt=finish).annotate(
+        day=TruncDate('order__created_at'),
+    )
+    orders = Order.objects.filter(created_at__gte=begin, created_at__lt=finish).annotate(day=TruncDate('created_at'))
+    line_totals = {'orders': Count('order', distinct=True), 'units': Sum('quantity'),
+                   'revenue': Sum(F('price') * F('quantity'))}
+
+    with transaction.atomic():
+        for model in (DailySales, DailyCategorySales, DailyProductSales):
+            model.objects.filter(date__gte=start, date__lte=end).delete()
+        overall = DailySales.objects.bulk_create([
+            DailySales(date=row['day'], orders=row['orders'], units=row['units'] or 0,
+                       revenue=row['revenue'] or Decimal('0.00'))
+            for row in orders.values('day').annotate(orders=Count('id'), units=Sum('item_count'), revenue=Sum('total'))
+        ], batch_size=batch_size)
+        categories = DailyCategorySales.objects.bulk_create([
+            DailyCategorySales(date=row['day'], category_id=row['product__category_id'], orders=row['orders'],
+                               units=row['units'], revenue=row['revenue'])
+            for row in items.values('day', 'product__category_id').annotate(**line_totals).order_by()
+        ], batch_size=batch_size)
+        products = DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=row['day'], product_id=row['product_id'], orders=row['orders'],
+                              units=row['units'], revenue=row['revenue'])
+            for row in items.values('day', 'product_id').annotate(**line_totals).order_by().iterator()
+        ], batch_size=batch_size)
+    return len(overall), len(categories), len(products)
+
+
+def series(start, end):
+    """Daily revenue, units, orders and AOV for ``start``..``end``, gaps filled with zeros."""
+    rows = {row.date: row for row in DailySales.objects.filter(date__gte=start, date__lte=end)}
+    days = []
+    day = start
+    while day <= end:
+        row = rows.get(day) or DailySales(date=day)
+        days.append({'date': day, 'orders': row.orders, 'units': row.units, 'revenue': row.revenue,
+                     'aov': row.average_order_value})
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def top_categories(start, end, limit=10):
+    return (DailyCategorySales.objects.filter(date__gte=start, date__lte=end)
+            .values('category_id', 'category__name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'))
+            .order_by('-revenue')[:limit])
+
+
+def top_products(start, end, limit=10):
+    return (DailyProductSales.objects.filter(date__gte=start, date__lte=end)
+            .values('product_id', 'product__title')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'))
+            .order_by('-revenue')[:limit])
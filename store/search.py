@@ -0,0 +1,121 @@
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .models import Product
+
+FTS_TABLE = 'store_product_fts'
+# bm25() column weights: a title hit counts for more than a description hit.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = {}
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall((query or '').lower())
+
+
+def build_match_expression(query):
+    # Every term must match; each one is quoted (so FTS operators in user input
+    # are inert) and prefix-matched so "lapt" finds "laptop".
+    return ' '.join(f'"{term}"*' for term in tokenize(query))
+
+
+def create_fts_table(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, description, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        # Persisted in the table, so every MATCH query's rank column is this bm25.
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) "
+            f"VALUES ('rank', 'bm25({TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})')"
+        )
+
+
+def fts_available(using='default'):
+    if using not in _fts_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            available = FTS_TABLE in connection.introspection.table_names()
+        _fts_available[using] = available
+    return _fts_available[using]
+
+
+def index_product(product, using='default'):
+    if not fts_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [product.pk, product.title, product.description],
+        )
+
+
+def unindex_product(product_id, using='default'):
+    if not fts_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_index(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return None
+    try:
+        create_fts_table(connection)
+    except OperationalError:
+        # SQLite built without FTS5; searches use the LIKE fallback.
+        return None
+    _fts_available.pop(using, None)
+    table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+            f'SELECT id, title, description FROM {table}'
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def _fts_search(queryset, query):
+    # A join on rowid lets SQLite drive the query from the index, rather than
+    # re-running the MATCH per product to compute its rank.
+    return queryset.filter(search_entry__document__match=build_match_expression(query)).annotate(
+        search_rank=F('search_entry__rank'),
+    )
+
+
+def _like_search(queryset, query):
+    terms = tokenize(query)
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    title_hits = Q()
+    for term in terms:
+        title_hits &= Q(title__icontains=term)
+    return queryset.annotate(search_rank=Case(
+        When(title_hits, then=Value(0)), default=Value(1), output_field=IntegerField(),
+    ))
+
+
+def search_products(queryset, query):
+    """
+    Filter ``queryset`` to products matching ``query`` and annotate
+    ``search_rank`` (lower is more relevant). Uses the SQLite FTS5 index when
+    present and falls back to per-term ``icontains`` elsewhere.
+    """
+    if not tokenize(query):
+        # Still annotated, so callers can order by search_rank.
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField())).none()
+    if fts_available(queryset.db):
+        return _fts_search(queryset, query)
+    return _like_search(queryset, query)
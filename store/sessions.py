@@ -0,0 +1,233 @@
+"""
+Session engine for cart-heavy traffic: ``SESSION_ENGINE = 'store.sessions'``.
+
+Sessions are read from and written to the STORE_SESSION_CACHE cache; the
+database copy is written behind. A changed session is queued in this
+process and the queue is flushed as one bulk upsert every
+STORE_SESSION_FLUSH_INTERVAL seconds (from a background thread), once it
+holds STORE_SESSION_FLUSH_BATCH sessions, and at exit. A burst of cart
+changes therefore costs one database write instead of one per request, and
+a save whose serialized data didn't change is skipped altogether.
+
+Creating and deleting a session still go straight to the database: a new
+key must be unique and a logged-out session must be gone. Loads check the
+cache, then the queue, then the database, so a session evicted from the
+cache before its flush isn't lost.
+
+Only this process knows about its queue, so with several worker processes
+the cache has to be shared between them (Redis, Memcached); a per-process
+LocMemCache is only right for a single process. Sessions changed in the
+last flush interval are lost if the process is killed outright.
+
+Expired rows are deleted in batches by SessionStore.clear_expired(), which
+both ``clearsessions`` and ``expire_sessions`` call.
+"""
+import atexit
+import hashlib
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.db import close_old_connections, router
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'store.sessions.'
+DEFAULT_CACHE = 'default'
+DEFAULT_FLUSH_INTERVAL = 5
+DEFAULT_FLUSH_BATCH = 500
+DEFAULT_CLEAR_BATCH = 5000
+
+
+def flush_interval():
+    return getattr(settings, 'STORE_SESSION_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def flush_batch():
+    return getattr(settings, 'STORE_SESSION_FLUSH_BATCH', DEFAULT_FLUSH_BATCH)
+
+
+class WriteBehindQueue:
+    """Sessions waiting to be written, ``{session_key: (session_data, expire_date)}``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held while queued sessions are written, and by deletes, so a
+        # session deleted mid-flush isn't written back afterwards.
+        self.write_lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get(self, session_key):
+        return self._pending.get(session_key)
+
+    def put(self, session_key, session_data, expire_date):
+        with self._lock:
+            self._pending[session_key] = (session_data, expire_date)
+            full = len(self._pending) >= flush_batch()
+            if self._thread is None and flush_interval():
+                self._thread = threading.Thread(target=self._run, name='store-session-flush', daemon=True)
+                self._thread.start()
+        if full:
+            self.flush()
+
+    def discard(self, session_key):
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def flush(self):
+        """Write every queued session in one upsert; returns how many."""
+        with self.write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            model = SessionStore.get_model_class()
+            try:
+                model.objects.using(router.db_for_write(model)).bulk_create(
+                    [model(session_key=key, session_data=data, expire_date=expire_date)
+                     for key, (data, expire_date) in pending.items()],
+                    update_conflicts=True, unique_fields=['session_key'], update_fields=['session_data', 'expire_date'],
+                )
+            except Exception:
+                # Put them back unless a newer save overtook them (deletes
+                # wait for the write lock).
+                with self._lock:
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                raise
+            return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(flush_interval() or DEFAULT_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write %d queued sessions', len(self))
+            finally:
+                close_old_connections()
+
+
+queue = WriteBehindQueue()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        queue.flush()
+    except Exception:
+        logger.exception('Could not write %d queued sessions at exit', len(queue))
+
+
+def fingerprint(serialized):
+    return hashlib.blake2b(serialized, digest_size=16).digest()
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[getattr(settings, 'STORE_SESSION_CACHE', DEFAULT_CACHE)]
+        self._saved = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def _fingerprint(self, data):
+        # encode() signs with a timestamp, so compare the serialized data.
+        return fingerprint(self.serializer().dumps(data))
+
+    def load(self):
+        try:
+            encoded = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends reject odd keys; treat it as a miss (Django #17810).
+            encoded = None
+        if encoded is None and (pending := queue.get(self.session_key)):
+            encoded, expire_date = pending
+            if expire_date <= timezone.now():
+                self._session_key = None
+                return {}
+        elif encoded is None:
+            session = self._get_session_from_db()
+            if session is None:
+                return {}
+            encoded = session.session_data
+            self._cache.set(self.cache_key, encoded, self.get_expiry_age(expiry=session.expire_date))
+        data = self.decode(encoded)
+        self._saved = self._fingerprint(data)
+        return data
+
+    def exists(self, session_key):
+        return bool(session_key) and (
+            queue.get(session_key) is not None
+            or (self.cache_key_prefix + session_key) in self._cache
+            or super().exists(session_key)
+        )
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        saved = self._fingerprint(data)
+        if not must_create and saved == self._saved:
+            return
+        if must_create:
+            super().save(must_create=True)
+            encoded = self.encode(data)
+        else:
+            encoded = self.encode(data)
+            queue.put(self.session_key, encoded, self.get_expiry_date())
+        try:
+            self._cache.set(self.cache_key, encoded, self.get_expiry_age())
+        except Exception:
+            logger.exception('Error saving session to cache (%s)', self._cache)
+        self._saved = saved
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is None:
+            return
+        with queue.write_lock:
+            queue.discard(session_key)
+            self._cache.delete(self.cache_key_prefix + session_key)
+            super().delete(session_key)
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    def clear_expired(cls, batch_size=DEFAULT_CLEAR_BATCH):
+        """Delete expired sessions ``batch_size`` at a time; returns how many."""
+        model = cls.get_model_class()
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(model.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(session_key__in=keys).delete()[0]
+
+    @classmethod
+    async def aclear_expired(cls):
+        return await sync_to_async(cls.clear_expired)()
@@ -0,0 +1,92 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cart_storage, catalog_cache, db_routing, identifiers, inventory, renditions, search, typeahead
+from .models import Category, Product, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, using='default', **kwargs):
+    if raw:
+        return
+    search.index_product(instance, using=using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, using='default', **kwargs):
+    search.unindex_product(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Product)
+def update_typeahead_index(sender, instance, raw=False, using='default', **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: typeahead.product_saved(instance), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_typeahead_index(sender, instance, using='default', **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: typeahead.product_deleted(product_id), using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+def generate_image_renditions(sender, instance, raw=False, **kwargs):
+    if raw or not renditions.needs_renditions(instance):
+        return
+    try:
+        renditions.update_renditions(instance)
+    except (OSError, ValueError):
+        # Unreadable upload: keep serving the original; build_renditions retries.
+        logger.warning('Could not build renditions for %r', instance, exc_info=True)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.bump_version()
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    if request is None or not hasattr(request, 'session'):
+        return
+    anonymous_key = request.session.get(cart_storage.CART_KEY_SESSION_ID)
+    backend = cart_storage.get_backend()
+    backend.merge_anonymous(request, user)
+    if anonymous_key and inventory.reservations_enabled():
+        inventory.transfer(anonymous_key, backend.user_key(user))
+    # Anything loaded earlier in this request belonged to the anonymous cart.
+    request.__dict__.pop('_cart_storage', None)
+
+
+@receiver(post_save, sender=User)
+def sync_user_identifiers(sender, instance, raw=False, update_fields=None, **kwargs):
+    # login() saves last_login alone on every sign-in; only a save that may
+    # change the username or email needs the identifiers synced.
+    if raw or (update_fields is not None and not {'username', 'email'} & update_fields):
+        return
+    identifiers.sync_user(instance, kinds=(identifiers.USERNAME, identifiers.EMAIL))
+
+
+@receiver(post_save, sender=UserProfile)
+def sync_profile_identifiers(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    identifiers.sync_user(instance.user, phone=instance.phone, kinds=(identifiers.PHONE,))
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    db_routing.apply_sqlite_pragmas(connection)
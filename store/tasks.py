@@ -0,0 +1,45 @@
+"""
+Background jobs (see store.jobs), queued by checkout and registration once
+their transaction commits.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from . import recommendations, rollups
+from .jobs import task
+from .models import Order
+
+
+@task(atomic=True)
+def record_order_stats(order_id):
+    # Sales rollups and co-purchase counts. Atomic, so a retry never counts
+    # an order twice.
+    order = Order.objects.get(pk=order_id)
+    lines = list(order.items.select_related('product').only('order', 'quantity', 'price', 'product__category_id'))
+    rollups.record_order(order, [(line.product, line.quantity, line.price) for line in lines])
+    recommendations.record_order([line.product_id for line in lines])
+
+
+@task
+def send_order_confirmation(order_id):
+    order = Order.objects.get(pk=order_id)
+    lines = order.items.select_related('product').only('order', 'quantity', 'price', 'product__title')
+    send_mail(
+        f'Your order #{order.pk}',
+        render_to_string('store/emails/order_confirmation.txt', {'order': order, 'lines': lines}),
+        settings.DEFAULT_FROM_EMAIL, [order.email],
+    )
+
+
+@task
+def send_welcome_email(user_id):
+    user = User.objects.get(pk=user_id)
+    if not user.email:
+        return
+    send_mail(
+        'Welcome to MyShop',
+        render_to_string('store/emails/welcome.txt', {'user': user}),
+        settings.DEFAULT_FROM_EMAIL, [user.email],
+    )
@@ -0,0 +1,43 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from store.page_cache import CSRF_PLACEHOLDER
+
+register = template.Library()
+
+DEFAULT_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(template_name, product):
+    return f'store:card:{template_name}:{product.pk}:{product.updated_at.timestamp()}'
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, template_name):
+    """
+    Render ``template_name`` once per product (as ``p``), caching each card
+    under the product's id and ``updated_at``. The whole page's cards come
+    from one ``cache.get_many``; only cards of products that changed are
+    rendered again, and stored with one ``set_many``.
+
+    Cards are cached with the CSRF placeholder in place of the token and
+    filled in here from the page's ``csrf_token``, which during a page cache
+    render is that same placeholder.
+    """
+    products = list(products)
+    keys = [card_key(template_name, product) for product in products]
+    cards = cache.get_many(keys)
+    missing = {}
+    card_template = None
+    for key, product in zip(keys, products):
+        if key not in cards:
+            card_template = card_template or get_template(template_name)
+            missing[key] = card_template.render({'p': product, 'csrf_token': CSRF_PLACEHOLDER})
+    if missing:
+        cache.set_many(missing, getattr(settings, 'STORE_CARD_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+        cards.update(missing)
+    html = ''.join(cards[key] for key in keys)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, str(context.get('csrf_token', ''))))
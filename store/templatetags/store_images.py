@@ -0,0 +1,43 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from store.renditions import CONTENT_TYPES
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(obj, sizes='100vw', css_class='', alt='', loading='lazy'):
+    """
+    Render ``obj.image`` as a <picture> with a srcset per format from the
+    stored rendition metadata, so neither the template nor this tag touches
+    the filesystem. Falls back to the original file when there are none.
+    """
+    image = getattr(obj, 'image', None)
+    if not image:
+        return ''
+    metadata = getattr(obj, 'image_renditions', None) or {}
+    variants = metadata.get('variants') if metadata.get('source') == image.name else None
+    if not variants:
+        return format_html('<img src="{}" class="{}" alt="{}" loading="{}">', image.url, css_class, alt, loading)
+
+    by_format = {}
+    for variant in variants:
+        by_format.setdefault(variant['format'], []).append(variant)
+    fallback_format = 'jpeg' if 'jpeg' in by_format else next(iter(by_format))
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (CONTENT_TYPES.get(fmt, f'image/{fmt}'), _srcset(items), sizes)
+        for fmt, items in by_format.items() if fmt != fallback_format
+    ))
+    fallback = by_format[fallback_format]
+    largest = fallback[-1]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" loading="{}"></picture>',
+        sources, default_storage.url(largest['name']), _srcset(fallback), sizes,
+        largest['width'], largest['height'], css_class, alt, loading,
+    )
+
+
+def _srcset(variants):
+    return ', '.join(f'{default_storage.url(v["name"])} {v["width"]}w' for v in variants)
@@ -0,0 +1,291 @@
+"""
+Search-as-you-type suggestions from an in-memory prefix index.
+
+Each process keeps the sorted vocabulary of normalized title tokens and,
+per token, its in-stock products ordered by units sold (out of stock
+products have no page to link to). A query's words are all prefixes ("blu
+lam" finds "Blue lamp"). The most selective word's lists are walked
+merged, best seller first, and the walk stops once ``limit`` products
+match the other words; when those rarely match, the two most selective
+words' products are intersected instead. Nothing touches the database.
+
+The index is built on first use. In this process, saving or deleting a
+product updates it in place once the transaction commits. Changes made
+elsewhere (other workers, bulk imports) show up as a new catalog version,
+and sales move the weights, so the index is also rebuilt in a background
+thread when the version has moved or it is older than
+STORE_TYPEAHEAD_MAX_AGE, at most every STORE_TYPEAHEAD_REFRESH_INTERVAL
+seconds. Queries keep using the current index meanwhile.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+from django.urls import reverse
+
+from . import catalog_cache
+from .models import OrderItem, Product
+from .search import tokenize
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+DEFAULT_REFRESH_INTERVAL = 60
+DEFAULT_MAX_AGE = 60 * 60
+# Results for one- and two-letter words are remembered: their ranges are
+# the widest, and they are what every search starts with.
+MEMO_PREFIX_LENGTH = 2
+# A word matching this many times more products than the most selective
+# one filters candidates instead of being intersected with them.
+SELECTIVITY_RATIO = 4
+# Products looked at before a query whose words rarely occur together
+# switches from walking to intersecting.
+WALK_LIMIT = 100
+# Merging more lists than this costs more than collecting them in a set.
+MERGE_LIMIT = 64
+SLUG_PLACEHOLDER = 'store-typeahead-slug'
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return tokenize(''.join(c for c in decomposed if not unicodedata.combining(c)))
+
+
+def _upper_bound(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class PrefixIndex:
+    def __init__(self, products, weights, version=None):
+        """``products`` are ``(id, title, slug, price)`` rows; ``weights`` maps ids to units sold."""
+        self.version = version
+        self.built_at = time.monotonic()
+        self.weights = weights
+        self.products = {}
+        self._tokens = {}
+        self._words = {}
+        self._postings = defaultdict(list)
+        self._memo = {}
+        self._lock = threading.Lock()
+        for product_id, title, slug, price in products:
+            for token in self._store(product_id, title, slug, price):
+                self._postings[token].append(product_id)
+        for postings in self._postings.values():
+            postings.sort(key=self._rank)
+        self._vocabulary = sorted(self._postings)
+
+    def __len__(self):
+        return len(self.products)
+
+    def _rank(self, product_id):
+        # Best sellers first.
+        return -self.weights.get(product_id, 0), product_id
+
+    def _store(self, product_id, title, slug, price):
+        tokens = tuple(sorted(set(normalize(title))))
+        self.products[product_id] = (title, slug, f'{price:.2f}')
+        self._tokens[product_id] = tokens
+        self._words[product_id] = ' ' + ' '.join(tokens)
+        return tokens
+
+    def _forget(self, tokens):
+        for token in tokens:
+            for length in range(1, MEMO_PREFIX_LENGTH + 1):
+                self._memo.pop(token[:length], None)
+
+    def update(self, product_id, title, slug, price):
+        with self._lock:
+            self._remove(product_id)
+            tokens = self._store(product_id, title, slug, price)
+            for token in tokens:
+                if token not in self._postings:
+                    insort(self._vocabulary, token)
+                insort(self._postings[token], product_id, key=self._rank)
+            self._forget(tokens)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        tokens = self._tokens.pop(product_id, ())
+        self.products.pop(product_id, None)
+        self._words.pop(product_id, None)
+        for token in tokens:
+            postings = self._postings[token]
+            position = bisect_left(postings, self._rank(product_id), key=self._rank)
+            if position < len(postings) and postings[position] == product_id:
+                del postings[position]
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+        self._forget(tokens)
+
+    def _matching(self, prefix):
+        vocabulary = self._vocabulary
+        return vocabulary[bisect_left(vocabulary, prefix):bisect_left(vocabulary, _upper_bound(prefix))]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """The ``limit`` best selling product ids whose title has a word starting with each word of ``query``."""
+        words = set(normalize(query))
+        if not words:
+            return []
+        with self._lock:
+            if len(words) == 1 and len(word := next(iter(words))) <= MEMO_PREFIX_LENGTH:
+                best = self._memo.get(word)
+                if best is None:
+                    best = self._memo[word] = self._search(words, MAX_LIMIT)
+                return best[:limit]
+            return self._search(words, limit)
+
+    def _search(self, words, limit):
+        matches = {word: self._matching(word) for word in words}
+        postings = self._postings
+        # Products per word, counted only as far as telling whether the word
+        # is selective enough to intersect with (every token has a product).
+        sizes = {}
+        for word in sorted(words, key=lambda word: len(matches[word])):
+            bound = SELECTIVITY_RATIO * min(sizes.values()) if sizes else math.inf
+            size = len(matches[word])
+            if size <= bound:
+                size = 0
+                for token in matches[word]:
+                    size += len(postings[token])
+                    if size > bound:
+                        break
+            sizes[word] = size if size <= bound else math.inf
+        driver, *others = sorted(words, key=sizes.get)
+        lists = [postings[token] for token in matches[driver]]
+        # " blue lamp" has a token starting with "la" where " la" occurs.
+        prefixes = [' ' + word for word in others]
+
+        if len(lists) <= MERGE_LIMIT:
+            best = self._walk(lists, prefixes, limit)
+            if best is not None:
+                return best
+        candidates = set(itertools.chain.from_iterable(lists))
+        if others and sizes[others[0]] != math.inf:
+            candidates.intersection_update(itertools.chain.from_iterable(postings[token] for token in matches[others[0]]))
+            prefixes = prefixes[1:]
+        if prefixes:
+            candidates = [product_id for product_id in candidates
+                          if all(prefix in self._words[product_id] for prefix in prefixes)]
+        return heapq.nsmallest(limit, candidates, key=self._rank)
+
+    def _walk(self, lists, prefixes, limit):
+        # Best sellers first, so common matches fill ``limit`` within a few
+        # steps. None when they are too rare to be worth walking to.
+        stream = lists[0] if len(lists) == 1 else heapq.merge(*lists, key=self._rank)
+        best, seen = [], set()
+        for product_id in stream:
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            if all(prefix in self._words[product_id] for prefix in prefixes):
+                best.append(product_id)
+                if len(best) == limit:
+                    break
+            elif len(seen) >= WALK_LIMIT:
+                return None
+        return best
+
+
+def load():
+    version = catalog_cache.get_version()
+    weights = dict(
+        OrderItem.objects.values('product_id').annotate(units=Sum('quantity')).values_list('product_id', 'units')
+    )
+    rows = (Product.objects.filter(in_stock=True).order_by().values_list('id', 'title', 'slug', 'price')
+            .iterator(chunk_size=5000))
+    return PrefixIndex(rows, weights, version=version)
+
+
+_index = None
+_lock = threading.Lock()
+_rebuilding = threading.Event()
+# Products saved or deleted here while a rebuild was reading the catalog.
+_touched = set()
+
+
+def _rebuild():
+    global _index
+    try:
+        index = load()
+        while True:
+            with _lock:
+                touched = set(_touched)
+                _touched.clear()
+                if not touched:
+                    _index = index
+                    return
+            rows = {row[0]: row for row in Product.objects.filter(id__in=touched, in_stock=True)
+                    .values_list('id', 'title', 'slug', 'price')}
+            for product_id in touched:
+                if product_id in rows:
+                    index.update(*rows[product_id])
+                else:
+                    index.remove(product_id)
+    finally:
+        _rebuilding.clear()
+        connection.close()
+
+
+def _stale(index):
+    age = time.monotonic() - index.built_at
+    if age < getattr(settings, 'STORE_TYPEAHEAD_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL):
+        return False
+    return age >= getattr(settings, 'STORE_TYPEAHEAD_MAX_AGE', DEFAULT_MAX_AGE) or index.version != catalog_cache.get_version()
+
+
+def get_index():
+    global _index
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                _index = load()
+            return _index
+    if not _rebuilding.is_set() and _stale(index):
+        _rebuilding.set()
+        threading.Thread(target=_rebuild, name='store-typeahead-rebuild', daemon=True).start()
+    return index
+
+
+def product_saved(product):
+    with _lock:
+        if _rebuilding.is_set():
+            _touched.add(product.pk)
+        if _index is None:
+            return
+        if product.in_stock:
+            _index.update(product.pk, product.title, product.slug, product.price)
+        else:
+            _index.remove(product.pk)
+
+
+def product_deleted(product_id):
+    with _lock:
+        if _rebuilding.is_set():
+            _touched.add(product_id)
+        if _index is not None:
+            _index.remove(product_id)
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    index = get_index()
+    product_url = reverse('store:product_detail', args=[SLUG_PLACEHOLDER])
+    results = []
+    for product_id in index.search(query, limit):
+        product = index.products.get(product_id)
+        if product is not None:
+            title, slug, price = product
+            results.append({'id': product_id, 'title': title, 'url': product_url.replace(SLUG_PLACEHOLDER, slug),
+                            'price': price})
+    return results
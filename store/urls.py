@@ -1,14 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'store'
 
+# The catalog and cart pages have async twins for ASGI deployments.
+catalog = async_views if getattr(settings, 'STORE_VIEW_MODE', 'sync') == 'async' else views
+
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('products/', views.product_list, name='product_list'),
-    path('category/<slug:category_slug>/', views.product_list, name='category'),
-    path('product/<slug:slug>/', views.product_detail, name='product_detail'),
-    path('cart/', views.cart_view, name='cart_view'),
+    path('', catalog.home, name='home'),
+    path('products/', catalog.product_list, name='product_list'),
+    path('category/<slug:category_slug>/', catalog.product_list, name='category'),
+    path('product/<slug:slug>/', catalog.product_detail, name='product_detail'),
+    path('search/suggest/', views.search_suggestions, name='search_suggestions'),
+    path('cart/', catalog.cart_view, name='cart_view'),
+    path('cart/api/', views.cart_api, name='cart_api'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:product_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
@@ -16,4 +22,10 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('metrics', views.metrics, name='metrics'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap'),
+    path('sitemap-pages.xml', views.sitemap_pages, name='sitemap_pages'),
+    path('sitemap-products-<int:chunk>.xml', views.sitemap_products, name='sitemap_products'),
+    path('feeds/products.csv', views.product_feed, {'fmt': 'csv'}, name='product_feed_csv'),
+    path('feeds/products.xml', views.product_feed, {'fmt': 'xml'}, name='product_feed_xml'),
 ]
@@ -1,84 +1,76 @@
+import gzip
+import json
+import uuid
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.http import require_POST
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST, require_http_methods
 from django.contrib import messages
-from django.core.paginator import Paginator
-from .models import Product, Category, Order, OrderItem, UserProfile
-from .cart import Cart
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_sequence
+from .models import Product, UserProfile
+from . import catalog_cache, feeds, jobs, recommendations, tasks, typeahead
+from .cart import Cart, CartError
+from .checkout import CheckoutError, find_existing_order, place_order
+from .instrumentation import render_metrics
+from .page_cache import cache_anonymous_page
+from .pagination import KeysetPaginator
+from .facets import ProductFilters
 from .forms import CheckoutForm, UserRegisterForm, EmailOrPhoneLoginForm
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login, authenticate, logout
 
+CART_API_MAX_OPERATIONS = 500
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+XML_CONTENT_TYPE = 'application/xml; charset=utf-8'
+FEED_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'xml': XML_CONTENT_TYPE}
+
+@cache_anonymous_page
 def home(request):
-    categories = Category.objects.all().order_by('name')
-    products = Product.objects.filter(in_stock=True).order_by('-created_at')
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Limited page numbers for pagination controls
-    total_pages = paginator.num_pages
-    current_page = page_obj.number
-    if total_pages <= 7:
-        page_range = range(1, total_pages + 1)
-    else:
-        if current_page <= 4:
-            page_range = list(range(1, 6)) + ['...', total_pages]
-        elif current_page > total_pages - 4:
-            page_range = [1, '...'] + list(range(total_pages-4, total_pages+1))
-        else:
-            page_range = [1, '...'] + list(range(current_page-1, current_page+2)) + ['...', total_pages]
+    categories = catalog_cache.get_categories()
+    products = Product.objects.filter(in_stock=True)
+    page_obj = KeysetPaginator(products, 12).get_page(request.GET)
 
     return render(request, 'store/home.html', {
         'categories': categories,
         'page_obj': page_obj,
-        'page_range': page_range,
+        'page_range': page_obj.page_range,
     })
 
+@cache_anonymous_page
 def product_list(request, category_slug=None):
-    query = request.GET.get('q')
-    products = Product.objects.all()
-    if query:
-        products = products.filter(title__icontains=query)
-
-    category = None
-    categories = Category.objects.all().order_by('name')
-
-    if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=category)
-
-    paginator = Paginator(products.order_by('-created_at'), 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    total_pages = paginator.num_pages
-    current_page = page_obj.number
-    if total_pages <= 7:
-        page_range = range(1, total_pages + 1)
-    else:
-        if current_page <= 4:
-            page_range = list(range(1, 6)) + ['...', total_pages]
-        elif current_page > total_pages - 4:
-            page_range = [1, '...'] + list(range(total_pages-4, total_pages+1))
-        else:
-            page_range = [1, '...'] + list(range(current_page-1, current_page+2)) + ['...', total_pages]
+    category = catalog_cache.get_category_or_404(category_slug) if category_slug else None
+    filters = ProductFilters(request.GET, category)
+    page_obj = KeysetPaginator(filters.products(), 12, ordering=filters.ordering).get_page(request.GET)
 
     return render(request, 'store/product_list.html', {
         'category': category,
-        'categories': categories,
+        'filters': filters,
+        'facets': filters.facets(),
         'page_obj': page_obj,
-        'page_range': page_range,
+        'page_range': page_obj.page_range,
     })
 
+@cache_anonymous_page
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug, in_stock=True)
-    return render(request, 'store/product_detail.html', {'product': product})
+    return render(request, 'store/product_detail.html', {
+        'product': product,
+        'recommendations': list(recommendations.for_product(product)),
+    })
 
 @require_POST
 def add_to_cart(request, product_id):
     qty = int(request.POST.get('quantity', 1))
-    Cart(request).add(product_id, quantity=qty)
-    messages.success(request, 'Added to cart.')
+    try:
+        Cart(request).add(product_id, quantity=qty)
+    except CartError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, 'Added to cart.')
     return redirect('store:cart_view')
 
 def cart_view(request):
@@ -88,15 +80,41 @@ def cart_view(request):
 @require_POST
 def update_cart(request, product_id):
     qty = int(request.POST.get('quantity', 1))
-    Cart(request).add(product_id, quantity=qty, override=True)
+    try:
+        Cart(request).add(product_id, quantity=qty, override=True)
+    except CartError as e:
+        messages.error(request, str(e))
     return redirect('store:cart_view')
 
+@require_http_methods(['GET', 'POST'])
+def cart_api(request):
+    cart = Cart(request)
+    if request.method == 'POST':
+        try:
+            operations = json.loads(request.body)['operations']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'errors': [{'error': 'Expected {"operations": [...]}.'}]}, status=400)
+        if not isinstance(operations, list) or len(operations) > CART_API_MAX_OPERATIONS:
+            return JsonResponse({'errors': [{'error': f'Send a list of at most {CART_API_MAX_OPERATIONS} operations.'}]}, status=400)
+        try:
+            cart.apply(operations)
+        except CartError as e:
+            return JsonResponse({'errors': e.errors, 'cart': cart.summary()}, status=400)
+    return JsonResponse(cart.summary())
+
 def remove_from_cart(request, product_id):
     Cart(request).remove(product_id)
     return redirect('store:cart_view')
 
 def checkout(request):
     cart = Cart(request)
+    if request.method == 'POST':
+        # A repeated submit after the first one emptied the cart.
+        existing = find_existing_order(request.POST.get('idempotency_key'))
+        if existing is not None:
+            messages.success(request, f'Thanks! Your order #{existing.id} was placed.')
+            return redirect('store:home')
+
     if len(cart) == 0:
         messages.warning(request, 'Your cart is empty.')
         return redirect('store:product_list')
@@ -104,26 +122,21 @@ def checkout(request):
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            order = Order.objects.create(
-                full_name=form.cleaned_data['full_name'],
-                email=form.cleaned_data['email'],
-                address=form.cleaned_data['address'],
-                city=form.cleaned_data['city'],
-                postal_code=form.cleaned_data['postal_code'],
-                paid=True,
-            )
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    price=item['price'],
-                    quantity=item['quantity']
+            try:
+                order, _ = place_order(
+                    form.cleaned_data,
+                    cart.quantities(),
+                    idempotency_key=form.cleaned_data['idempotency_key'],
+                    cart_key=cart.storage.key(),
                 )
+            except CheckoutError as e:
+                messages.error(request, str(e))
+                return redirect('store:cart_view')
             cart.clear()
             messages.success(request, f'Thanks! Your order #{order.id} was placed.')
             return redirect('store:home')
     else:
-        form = CheckoutForm()
+        form = CheckoutForm(initial={'idempotency_key': uuid.uuid4().hex})
 
     return render(request, 'store/checkout.html', {'form': form, 'cart': cart})
 
@@ -139,6 +152,7 @@ def register_view(request):
             # Save phone number
             phone = form.cleaned_data.get('phone')
             UserProfile.objects.create(user=user, phone=phone)
+            jobs.enqueue_on_commit(tasks.send_welcome_email, user_id=user.pk, dedupe_key=f'welcome:{user.pk}')
             # Authenticate user with username and password
             user = authenticate(request, username=user.username, password=form.cleaned_data['password'])
             if user is not None:
@@ -177,3 +191,70 @@ def logout_view(request):
     logout(request)
     messages.info(request, "You have been logged out.")
     return redirect('store:home')
+
+def search_suggestions(request):
+    # Typeahead for the navbar search box, answered from the in-memory index.
+    try:
+        limit = min(int(request.GET.get('limit', typeahead.DEFAULT_LIMIT)), typeahead.MAX_LIMIT)
+    except ValueError:
+        limit = typeahead.DEFAULT_LIMIT
+    query = request.GET.get('q', '')[:100]
+    response = JsonResponse({'query': query, 'results': typeahead.suggest(query, max(limit, 1))})
+    response['Cache-Control'] = 'max-age=60'
+    return response
+
+def metrics(request):
+    # Prometheus scrape target: needs the bearer token when one is set, and
+    # is otherwise only open to staff (or anyone under DEBUG).
+    token = getattr(settings, 'STORE_METRICS_TOKEN', None)
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = settings.DEBUG or request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Sitemaps and shopping feeds: the files written by generate_feeds when they
+# exist, otherwise streamed live. Gzipped for clients that accept it.
+
+def _feed_response(request, name, content_type, live):
+    gzipped = bool(re_accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+    path = feeds.generated_file(name + '.gz')
+    if path is not None and gzipped:
+        response = FileResponse(open(path, 'rb'), content_type=content_type, filename=name)
+        response['Content-Encoding'] = 'gzip'
+    elif path is not None:
+        response = StreamingHttpResponse(_read_gzip(path), content_type=content_type)
+    elif gzipped:
+        response = StreamingHttpResponse(compress_sequence(piece.encode() for piece in live()),
+                                         content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(live(), content_type=content_type)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+def _read_gzip(path):
+    with gzip.open(path, 'rb') as fh:
+        while block := fh.read(feeds.BUFFER_SIZE):
+            yield block
+
+def _base_url(request):
+    return request.build_absolute_uri('/')
+
+def sitemap_index(request):
+    return _feed_response(request, 'sitemap.xml', XML_CONTENT_TYPE,
+                          lambda: feeds.sitemap_index(_base_url(request), feeds.chunk_signatures()))
+
+def sitemap_pages(request):
+    return _feed_response(request, 'sitemap-pages.xml', XML_CONTENT_TYPE,
+                          lambda: feeds.pages_sitemap(_base_url(request)))
+
+def sitemap_products(request, chunk):
+    return _feed_response(request, f'sitemap-products-{chunk}.xml', XML_CONTENT_TYPE,
+                          lambda: feeds.stream_sitemap(_base_url(request), chunk))
+
+def product_feed(request, fmt):
+    return _feed_response(request, f'products.{fmt}', FEED_CONTENT_TYPES[fmt],
+                          lambda: feeds.stream_feed(_base_url(request), fmt))